@@ -5,6 +5,7 @@
 3、人口城镇化
 4、人口增长率
 5、人口老化（抚养比）
+6、人口预测
 
 获取详细教程、获取代码帮助、提出意见建议
 关注微信公众号「裸睡的猪」与猪哥联系
@@ -12,41 +13,131 @@
 @Author  :   猪哥
 
 """
+import argparse
+import hashlib
+import importlib
+import inspect
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
 import numpy as np
 import pandas as pd
 import pyecharts.options as opts
 from pyecharts.charts import Line, Bar, Page, Pie
-from pyecharts.commons.utils import JsCode
 
-# 人口数量excel文件保存路径
-POPULATION_EXCEL_PATH = 'population.xlsx'
+from population_changes import CHANGE_LOG_PATH, changed_indicators, read_changes
+from population_data import (POPULATION_EXCEL_PATH, at_year, complete_years, get_dataset, get_region_dataset,
+                             get_region_store, is_mapped, region_names, set_dataset, set_region_store, year_positions)
+from population_files import atomic_open
+from population_indicators import derived_indicators
+from population_projection import (AGE_COLUMNS, PROJECTION_YEARS, RATE_COLUMNS, SCENARIOS, project, projection_inputs,
+                                   summarize)
+from population_render import render_page, set_chart_ids
+from population_theme import fragment
+from population_trace import enable as enable_trace, span, traced
+from population_transform import to_yi
+
+# 图表中标出的年份，{名称: 年份}，行号在数据处理时按年份查找，数据增加年份后仍然正确
+# 总人口曲线，另外还会标出最后一年
+TOTAL_EVENTS = {'新中国成立（1949年）': 1949, '计划生育（1980年）': 1980, '放开二胎（2016年）': 2016}
+# 乡村人口曲线
+URBANIZATION_EVENTS = {'1995': 1995, '2010': 2010}
+# 总抚养比曲线
+DEPENDENCY_EVENTS = {'1995年': 1995}
+# 年龄结构的列
+AGE_STRUCTURE_COLUMNS = ['0-14岁人口(万人)', '15-64岁人口(万人)', '65岁及以上人口(万人)']
+
+# 构建记录文件，记录每个报告上次渲染时的数据和图表配置的 hash
+BUILD_MANIFEST_PATH = '.population_build.json'
+# 构建记录中保存变化记录读取位置的 key，{变化记录文件: {报告: 读取到的位置}}，每个报告只在检查过之后前进
+CHANGES_CURSOR_KEY = '#changes'
+# 分地区报告的输出目录，每个地区一个子目录，例如 regions/北京市/population_total.html
+REGION_OUTPUT_DIR = 'regions'
+# 所有报告共用的模块，代码变化后所有报告都需要重新渲染
+CONFIG_MODULES = ['population_theme', 'population_indicators', 'population_transform', 'population_render',
+                  'population_data']
+# 所有报告共用的函数，代码变化后所有报告都需要重新渲染
+CONFIG_FUNCTIONS = ['build_report', 'place_name', 'period_title']
+
 
-# 读取标准数据
-DF_STANDARD = pd.read_excel(POPULATION_EXCEL_PATH)
-# 自定义pyecharts图形背景颜色js
-background_color_js = (
-    "new echarts.graphic.LinearGradient(0, 0, 0, 1, "
-    "[{offset: 0, color: '#c86589'}, {offset: 1, color: '#06a7ff'}], false)"
-)
-# 自定义pyecharts图像区域颜色js
-area_color_js = (
-    "new echarts.graphic.LinearGradient(0, 0, 0, 1, "
-    "[{offset: 0, color: '#eb64fb'}, {offset: 1, color: '#3fbbff0d'}], false)"
-)
+def __getattr__(name):
+    # 兼容原来的 DF_STANDARD 变量，使用时才读取数据
+    if name == 'DF_STANDARD':
+        return get_dataset()
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
 
-def analysis_total():
+def report_dataset(region=None):
     """
-    分析总人口
+    报告使用的数据，region 为 None 时是全国数据，否则是该地区的数据
+    """
+    return get_dataset() if region is None else get_region_dataset(region)
+
+
+def place_name(region=None):
+    """
+    图表标题中的地区名，全国数据为 中国
+    """
+    return '中国' if region is None else region
+
+
+def period_title(place, years):
+    """
+    标题中的时间段，例如 中国70年(1949-2019)，years 为按年份排序的年份列
     """
+    first, last = int(years[0]), int(years[-1])
+    return '%s%d年(%d-%d)' % (place, last - first, first, last)
+
+
+def build_report(name, prepare, chart, path, region=None, **render_options):
+    """
+    生成报告：读取数据 -> 数据处理 -> 生成图表 -> 渲染，各阶段分别计时，见 population_trace
+    """
+    with span('report.load', report=name, region=region):
+        df = report_dataset(region)
+    with span('report.prepare', report=name, region=region):
+        data = prepare(df, region)
+    with span('report.chart', report=name, region=region):
+        page = chart(data)
+        set_chart_ids(page, report_key(name, region))
+    with span('report.render', report=name, region=region):
+        render_page(page, path, **render_options)
+
+
+def prepare_total(df, region=None):
+    """
+    总人口数据处理
+    :param region: 地区名，用于图表标题，默认为全国数据
+    """
+    indicators = derived_indicators(df)
+    # 1、总人口曲线数据
+    x_data = df['年份']
+    # 人口单位为亿
+    y_data = indicators['年末总人口(亿人)']
+    # 标记点所在的行号
+    last_year = int(x_data.values[-1])
+    events = year_positions(x_data, dict(TOTAL_EVENTS, **{'%d年' % last_year: last_year}))
+    # 2、计划生育执行前后增长人口，缺少 1949、1979、2010 年数据（例如分地区数据）时为 None，不画柱状图
+    increase_1949_1979 = indicators.get('1949-1979年总人口增量(亿人)')
+    increase_1979_2010 = indicators.get('1979-2010年总人口增量(亿人)')
+    # 全国数据的标题为 新中国70年人口变化
+    title = '%s%d年人口变化(亿人)' % ('新中国' if region is None else region, last_year - int(x_data.values[0]))
+    return {'x_data': x_data, 'y_data': y_data, 'events': events, 'title': title,
+            'increase_1949_1979': increase_1949_1979, 'increase_1979_2010': increase_1979_2010}
+
+
+def chart_total(data):
+    """
+    总人口图表
+    """
+    x_data, y_data, events, title = data['x_data'], data['y_data'], data['events'], data['title']
+    increase_1949_1979, increase_1979_2010 = data['increase_1949_1979'], data['increase_1979_2010']
     # 1、分析总人口，画人口曲线图
-    # 1.1 处理数据
-    x_data = DF_STANDARD['年份']
-    # 将人口单位转换为亿
-    y_data = DF_STANDARD['年末总人口(万人)'].map(lambda x: "%.2f" % (x / 10000))
-    # 1.2 自定义曲线图
     line = (
-        Line(init_opts=opts.InitOpts(bg_color=JsCode(background_color_js)))
+        Line(init_opts=fragment('dark_init'))
             .add_xaxis(xaxis_data=x_data)
             .add_yaxis(
             series_name="总人口",
@@ -61,14 +152,10 @@ def analysis_total():
                 color="red", border_color="#fff", border_width=1
             ),
             tooltip_opts=opts.TooltipOpts(is_show=False),
-            areastyle_opts=opts.AreaStyleOpts(color=JsCode(area_color_js), opacity=1),
-            # 标出4个关键点的数据
+            areastyle_opts=opts.AreaStyleOpts(color=fragment('dark_area'), opacity=1),
+            # 标出关键点的数据
             markpoint_opts=opts.MarkPointOpts(
-                data=[opts.MarkPointItem(name="新中国成立（1949年）", coord=[0, y_data[0]], value=y_data[0]),
-                      opts.MarkPointItem(name="计划生育（1980年）", coord=[31, y_data[31]], value=y_data[31]),
-                      opts.MarkPointItem(name="放开二胎（2016年）", coord=[67, y_data[67]], value=y_data[67]),
-                      opts.MarkPointItem(name="2019年", coord=[70, y_data[70]], value=y_data[70])
-                      ]
+                data=[opts.MarkPointItem(name=name, coord=[i, y_data[i]], value=y_data[i]) for name, i in events.items()]
             ),
             # markline_opts 可以画直线
             # markline_opts=opts.MarkLineOpts(
@@ -81,173 +168,174 @@ def analysis_total():
         )
             .set_global_opts(
             title_opts=opts.TitleOpts(
-                title="新中国70年人口变化(亿人)",
+                title=title,
                 pos_bottom="5%",
                 pos_left="center",
-                title_textstyle_opts=opts.TextStyleOpts(color="#fff", font_size=16),
+                title_textstyle_opts=fragment('dark_title_text'),
             ),
             # x轴相关的选项设置
             xaxis_opts=opts.AxisOpts(
                 type_="category",
                 boundary_gap=False,
-                axislabel_opts=opts.LabelOpts(margin=30, color="#ffffff63"),
-                axisline_opts=opts.AxisLineOpts(is_show=False),
-                axistick_opts=opts.AxisTickOpts(
-                    is_show=True,
-                    length=25,
-                    linestyle_opts=opts.LineStyleOpts(color="#ffffff1f"),
-                ),
-                splitline_opts=opts.SplitLineOpts(
-                    is_show=False, linestyle_opts=opts.LineStyleOpts(color="#ffffff1f")
-                ),
+                axislabel_opts=fragment('dark_axis_label_x'),
+                axisline_opts=fragment('hidden_axis_line'),
+                axistick_opts=fragment('dark_axis_tick_x'),
+                splitline_opts=fragment('dark_split_line'),
             ),
             # y轴相关选项设置
             yaxis_opts=opts.AxisOpts(
                 type_="value",
                 position="left",
-                axislabel_opts=opts.LabelOpts(margin=20, color="#ffffff63"),
-                axisline_opts=opts.AxisLineOpts(
-                    linestyle_opts=opts.LineStyleOpts(width=0, color="#ffffff1f")
-                ),
-                axistick_opts=opts.AxisTickOpts(
-                    is_show=True,
-                    length=15,
-                    linestyle_opts=opts.LineStyleOpts(color="#ffffff1f"),
-                ),
-                splitline_opts=opts.SplitLineOpts(
-                    is_show=False, linestyle_opts=opts.LineStyleOpts(color="#ffffff1f")
-                ),
+                axislabel_opts=fragment('dark_axis_label_y'),
+                axisline_opts=fragment('dark_axis_line'),
+                axistick_opts=fragment('dark_axis_tick_y'),
+                splitline_opts=fragment('dark_split_line'),
             ),
             # 图例配置项相关设置
-            legend_opts=opts.LegendOpts(is_show=False),
+            legend_opts=fragment('hidden_legend'),
         )
     )
-    # 2、分析计划生育执行前后增长人口
-    # 2.1 数据处理
-    total_1949 = DF_STANDARD[DF_STANDARD['年份'] == 1949]['年末总人口(万人)'].values
-    total_1979 = DF_STANDARD[DF_STANDARD['年份'] == 1979]['年末总人口(万人)'].values
-    total_2010 = DF_STANDARD[DF_STANDARD['年份'] == 2010]['年末总人口(万人)'].values
-    increase_1949_1979 = '%.2f' % (int(total_1979 - total_1949) / 10000)
-    increase_1979_2010 = '%.2f' % (int(total_2010 - total_1979) / 10000)
-    # 2.2 画柱状图
+    # 2、渲染图像，将多个图像显示在一个html中
+    # DraggablePageLayout表示可拖拽
+    page = Page(layout=Page.DraggablePageLayout)
+    page.add(line)
+    # 3、分析计划生育执行前后增长人口，画柱状图；缺少这几年的数据时只有人口曲线
+    if increase_1949_1979 is None or increase_1979_2010 is None:
+        return page
     bar = (
-        Bar(init_opts=opts.InitOpts(bg_color=JsCode(background_color_js)))
+        Bar(init_opts=fragment('dark_init'))
             .add_xaxis([''])
-            .add_yaxis("前31年：1949-1979", [increase_1949_1979], color=JsCode(area_color_js),
-                       label_opts=opts.LabelOpts(color='white', font_size=16))
-            .add_yaxis("后31年：1980-2010", [increase_1979_2010], color=JsCode(area_color_js),
-                       label_opts=opts.LabelOpts(color='white', font_size=16))
+            .add_yaxis("前31年：1949-1979", [increase_1949_1979], color=fragment('dark_area'),
+                       label_opts=fragment('dark_value_label'))
+            .add_yaxis("后31年：1980-2010", [increase_1979_2010], color=fragment('dark_area'),
+                       label_opts=fragment('dark_value_label'))
             .set_global_opts(
             title_opts=opts.TitleOpts(
                 title="计划生育执行前31年（1949-1979）与后31年（1980-2010）增加人口总数比较（亿人）",
                 pos_bottom="5%",
                 pos_left="center",
-                title_textstyle_opts=opts.TextStyleOpts(color="#fff", font_size=16)
+                title_textstyle_opts=fragment('dark_title_text')
             ),
             xaxis_opts=opts.AxisOpts(
                 # 隐藏x轴的坐标线
-                axisline_opts=opts.AxisLineOpts(is_show=False),
+                axisline_opts=fragment('hidden_axis_line'),
             ),
             yaxis_opts=opts.AxisOpts(
                 # y轴坐标数值
-                axislabel_opts=opts.LabelOpts(margin=20, color="#ffffff63"),
+                axislabel_opts=fragment('dark_axis_label_y'),
                 # y 轴 轴线
-                axisline_opts=opts.AxisLineOpts(
-                    linestyle_opts=opts.LineStyleOpts(width=0, color="#ffffff1f")
-                ),
+                axisline_opts=fragment('dark_axis_line'),
                 # y轴刻度横线
-                axistick_opts=opts.AxisTickOpts(
-                    is_show=True,
-                    length=15,
-                    linestyle_opts=opts.LineStyleOpts(color="#ffffff1f"),
-                ),
+                axistick_opts=fragment('dark_axis_tick_y'),
             ),
-            legend_opts=opts.LegendOpts(is_show=False)
+            legend_opts=fragment('hidden_legend')
         )
     )
-    # 3、渲染图像，将多个图像显示在一个html中
-    # DraggablePageLayout表示可拖拽
-    page = Page(layout=Page.DraggablePageLayout)
-    page.add(line)
     page.add(bar)
-    page.render('population_total.html')
+    return page
 
 
-def analysis_sex():
+def analysis_total(path='population_total.html', region=None, **render_options):
     """
-    分析男女比
+    分析总人口
+    :param region: 地区名，默认为全国数据
+    :param render_options: 渲染参数，见 population_render.render_page
+    """
+    build_report('total', prepare_total, chart_total, path, region, **render_options)
+
+
+def prepare_sex(df, region=None):
+    """
+    男女比数据处理
+    :param region: 地区名，用于图表标题，默认为全国数据
     """
+    indicators = derived_indicators(df)
     # 年份
-    x_data_year = DF_STANDARD['年份']
-    # 1、2019年男女比饼图
-    sex_2019 = DF_STANDARD[DF_STANDARD['年份'] == 2019][['男性人口(万人)', '女性人口(万人)']]
+    x_data_year = df['年份']
+    # 最近一年的男女人口
+    sex_year = int(complete_years(df, ['男性人口(万人)', '女性人口(万人)'])[-1])
+    sex_latest = at_year(df, sex_year, ['男性人口(万人)', '女性人口(万人)'])
+    # 男性占总人数比：（男性数/总数）x 100 ，保留两位小数
+    man_percent = indicators['男性人口占比(%)']
+    # 历年男性人口数
+    y_data_man = df['男性人口(万人)']
+    # 历年女性人口数
+    y_data_woman = df['女性人口(万人)']
+    # 男女人口差值
+    y_data_man_woman = indicators['男女人口差(万人)']
+    return {'place': place_name(region), 'period': period_title(place_name(region), x_data_year.values),
+            'x_data_year': x_data_year, 'sex_year': sex_year, 'sex_latest': sex_latest, 'man_percent': man_percent,
+            'y_data_man': y_data_man, 'y_data_woman': y_data_woman, 'y_data_man_woman': y_data_man_woman}
+
+
+def chart_sex(data):
+    """
+    男女比图表
+    """
+    place, period, x_data_year, man_percent = data['place'], data['period'], data['x_data_year'], data['man_percent']
+    sex_year, sex_latest = data['sex_year'], data['sex_latest']
+    y_data_man, y_data_woman, y_data_man_woman = data['y_data_man'], data['y_data_woman'], data['y_data_man_woman']
+    # 1、最近一年男女比饼图
     pie = (
         Pie()
-            .add("", [list(z) for z in zip(['男', '女'], np.ravel(sex_2019.values))])
-            .set_global_opts(title_opts=opts.TitleOpts(title="2019中国男女比", pos_bottom="bottom", pos_left="center"))
+            .add("", [list(z) for z in zip(['男', '女'], sex_latest)])
+            .set_global_opts(title_opts=opts.TitleOpts(title="%d%s男女比" % (sex_year, place), pos_bottom="bottom",
+                                                       pos_left="center"))
             .set_series_opts(label_opts=opts.LabelOpts(formatter="{b}: {d}%"))
     )
     # 2、历年男性占总人数比曲线
-    # （男性数/总数）x 100 ，然后保留两位小数
-    man_percent = (DF_STANDARD['男性人口(万人)'] / DF_STANDARD['年末总人口(万人)']).map(lambda x: "%.2f" % (x * 100))
     line1 = (
         Line()
             .add_xaxis(x_data_year)
             .add_yaxis(
             series_name="男性占总人口比",
-            y_axis=man_percent.values,
+            y_axis=man_percent,
             # 标出关键点的数据
             markpoint_opts=opts.MarkPointOpts(data=[opts.MarkPointItem(type_="min"), opts.MarkPointItem(type_="max")]),
             # 画出平均线
             markline_opts=opts.MarkLineOpts(data=[opts.MarkLineItem(type_="average")])
         )
             .set_global_opts(
-            title_opts=opts.TitleOpts(title="中国70年(1949-2019)男性占总人数比", pos_left="center", pos_top="bottom"),
-            xaxis_opts=opts.AxisOpts(type_="category"),
+            title_opts=opts.TitleOpts(title="%s男性占总人数比" % period, pos_left="center", pos_top="bottom"),
+            xaxis_opts=fragment('category_axis'),
             # y轴显示百分比，并设置最小值和最大值
             yaxis_opts=opts.AxisOpts(type_="value", max_=52, min_=50,
                                      axislabel_opts=opts.LabelOpts(formatter='{value} %')),
-            legend_opts=opts.LegendOpts(is_show=False),
+            legend_opts=fragment('hidden_legend'),
         )
-            .set_series_opts(label_opts=opts.LabelOpts(is_show=False))
+            .set_series_opts(label_opts=fragment('hidden_label'))
     )
 
     # 3、男女折线图
-    # 历年男性人口数
-    y_data_man = DF_STANDARD['男性人口(万人)']
-    # 历年女性人口数
-    y_data_woman = DF_STANDARD['女性人口(万人)']
     line2 = (
         Line()
             .add_xaxis(x_data_year)
             .add_yaxis("女性", y_data_woman)
             .add_yaxis("男性", y_data_man)
             .set_global_opts(
-            title_opts=opts.TitleOpts(title="中国70年(1949-2019)男女人口数(万人)", pos_left="center", pos_top="bottom"),
-            xaxis_opts=opts.AxisOpts(type_="category"),
+            title_opts=opts.TitleOpts(title="%s男女人口数(万人)" % period, pos_left="center", pos_top="bottom"),
+            xaxis_opts=fragment('category_axis'),
         )
-            .set_series_opts(label_opts=opts.LabelOpts(is_show=False))
+            .set_series_opts(label_opts=fragment('hidden_label'))
     )
     # 4、男女人口差异图
-    # 两列相减，获得新列
-    y_data_man_woman = DF_STANDARD['男性人口(万人)'] - DF_STANDARD['女性人口(万人)']
     line3 = (
         Line()
             .add_xaxis(x_data_year)
             .add_yaxis(
             series_name="男女差值",
-            y_axis=y_data_man_woman.values,
+            y_axis=y_data_man_woman,
             # 标出关键点的数据
             markpoint_opts=opts.MarkPointOpts(data=[opts.MarkPointItem(type_="min"), opts.MarkPointItem(type_="max"),
                                                     opts.MarkPointItem(type_="average")]),
             markline_opts=opts.MarkLineOpts(data=[opts.MarkLineItem(type_="average")])
         )
             .set_global_opts(
-            title_opts=opts.TitleOpts(title="中国70年(1949-2019)男女差值（万人）", pos_left="center", pos_top="bottom"),
-            xaxis_opts=opts.AxisOpts(type_="category"),
-            legend_opts=opts.LegendOpts(is_show=False),
+            title_opts=opts.TitleOpts(title="%s男女差值（万人）" % period, pos_left="center", pos_top="bottom"),
+            xaxis_opts=fragment('category_axis'),
+            legend_opts=fragment('hidden_legend'),
         )
-            .set_series_opts(label_opts=opts.LabelOpts(is_show=False))
+            .set_series_opts(label_opts=fragment('hidden_label'))
     )
 
     # 5、渲染图像，将多个图像显示在一个html中
@@ -256,28 +344,61 @@ def analysis_sex():
     page.add(line1)
     page.add(line2)
     page.add(line3)
-    page.render('population_sex.html')
+    return page
 
 
-def analysis_urbanization():
+def analysis_sex(path='population_sex.html', region=None, **render_options):
     """
-    分析我国人口城镇化
+    分析男女比
+    :param region: 地区名，默认为全国数据
+    :param render_options: 渲染参数，见 population_render.render_page
+    """
+    build_report('sex', prepare_sex, chart_sex, path, region, **render_options)
+
+
+def prepare_urbanization(df, region=None):
+    """
+    人口城镇化数据处理
+    :param region: 地区名，用于图表标题，默认为全国数据
     """
+    indicators = derived_indicators(df)
     # 年份
-    x_data_year = DF_STANDARD['年份']
-    # 2019年我国人口城镇化
-    urbanization_2019 = DF_STANDARD[DF_STANDARD['年份'] == 2019][['城镇人口(万人)', '乡村人口(万人)']]
+    x_data_year = df['年份']
+    # 最近一年的人口城镇化
+    urbanization_year = int(complete_years(df, ['城镇人口(万人)', '乡村人口(万人)'])[-1])
+    urbanization_latest = at_year(df, urbanization_year, ['城镇人口(万人)', '乡村人口(万人)'])
+    # 城乡人口，单位为亿
+    y_data_city = indicators['城镇人口(亿人)']
+    y_data_countryside = indicators['乡村人口(亿人)']
+    # 城镇化比例
+    y_data_urbanization = indicators['城镇化率(%)']
+    # 标记线所在的行号
+    events = year_positions(x_data_year, URBANIZATION_EVENTS)
+    return {'place': place_name(region), 'period': period_title(place_name(region), x_data_year.values),
+            'x_data_year': x_data_year, 'urbanization_year': urbanization_year,
+            'urbanization_latest': urbanization_latest, 'y_data_city': y_data_city,
+            'y_data_countryside': y_data_countryside, 'y_data_urbanization': y_data_urbanization, 'events': events}
+
+
+def chart_urbanization(data):
+    """
+    人口城镇化图表
+    """
+    place, period, x_data_year = data['place'], data['period'], data['x_data_year']
+    urbanization_year, urbanization_latest = data['urbanization_year'], data['urbanization_latest']
+    y_data_city, y_data_countryside = data['y_data_city'], data['y_data_countryside']
+    y_data_urbanization, events = data['y_data_urbanization'], data['events']
+    # 1、最近一年城镇化比例饼图
     pie = (
         Pie()
-            .add("", [list(z) for z in zip(['城镇人口', '乡村人口'], np.ravel(urbanization_2019.values))])
-            .set_global_opts(title_opts=opts.TitleOpts(title="2019中国城镇化比例", pos_bottom="bottom", pos_left="center", ),
-                             legend_opts=opts.LegendOpts(is_show=False))
+            .add("", [list(z) for z in zip(['城镇人口', '乡村人口'], urbanization_latest)])
+            .set_global_opts(title_opts=opts.TitleOpts(title="%d%s城镇化比例" % (urbanization_year, place),
+                                                       pos_bottom="bottom", pos_left="center", ),
+                             legend_opts=fragment('hidden_legend'))
             .set_series_opts(label_opts=opts.LabelOpts(formatter="{b}: {d}%"))
 
     )
     # 2、城镇化比例曲线
-    y_data_city = DF_STANDARD['城镇人口(万人)'] / 10000
-    y_data_countryside = DF_STANDARD['乡村人口(万人)'] / 10000
     line1 = (
         Line()
             .add_xaxis(x_data_year)
@@ -288,47 +409,45 @@ def analysis_urbanization():
                            # 去除标记线的箭头
                            symbol='none',
                            label_opts=opts.LabelOpts(font_size=16),
-                           data=[[opts.MarkLineItem(coord=[46, 0]),
-                                  opts.MarkLineItem(name='1995', coord=[46, y_data_countryside[46]])],
-                                 [opts.MarkLineItem(coord=[61, 0]),
-                                  opts.MarkLineItem(name='2010', coord=[61, y_data_countryside[61]])]],
+                           data=[[opts.MarkLineItem(coord=[i, 0]),
+                                  opts.MarkLineItem(name=name, coord=[i, y_data_countryside[i]])]
+                                 for name, i in events.items()],
                            # opacity不透明度 0 - 1
                            linestyle_opts=opts.LineStyleOpts(color="red", opacity=0.3)
                        ),
                        # 标出关键点的数据
                        markpoint_opts=opts.MarkPointOpts(
-                           data=[opts.MarkPointItem(name="1995年", coord=[46, y_data_countryside[46]],
-                                                    value="%.2f" % (y_data_countryside[46])),
-                                 opts.MarkPointItem(name="2010年", coord=[61, y_data_countryside[61]],
-                                                    value="%.2f" % (y_data_countryside[61]))]
+                           data=[opts.MarkPointItem(name="%s年" % name, coord=[i, y_data_countryside[i]],
+                                                    value=y_data_countryside[i])
+                                 for name, i in events.items()]
                        )
                        )
             .set_global_opts(
-            title_opts=opts.TitleOpts(title="中国70年(1949-2019)城乡人口曲线（亿人）", pos_left="center", pos_top="bottom"),
-            xaxis_opts=opts.AxisOpts(type_="category")
+            title_opts=opts.TitleOpts(title="%s城乡人口曲线（亿人）" % period, pos_left="center", pos_top="bottom"),
+            xaxis_opts=fragment('category_axis')
         )
-            .set_series_opts(label_opts=opts.LabelOpts(is_show=False))
+            .set_series_opts(label_opts=fragment('hidden_label'))
     )
 
     # 3、城镇化曲线
-    y_data_urbanization = (DF_STANDARD['城镇人口(万人)'] / DF_STANDARD['年末总人口(万人)']).map(lambda x: "%.2f" % (x * 100))
     line2 = (
         Line()
             .add_xaxis(x_data_year)
             .add_yaxis(
-            series_name="中国人口城镇化比例曲线",
-            y_axis=y_data_urbanization.values,
+            series_name="%s人口城镇化比例曲线" % place,
+            y_axis=y_data_urbanization,
             markline_opts=opts.MarkLineOpts(symbol='none', data=[opts.MarkLineItem(y=30), opts.MarkLineItem(y=70)])
         )
             .set_global_opts(
-            title_opts=opts.TitleOpts(title="中国(1949-2019)人口城镇化比例曲线", pos_left="center", pos_top="bottom"),
-            xaxis_opts=opts.AxisOpts(type_="category"),
+            title_opts=opts.TitleOpts(title="%s(%d-%d)人口城镇化比例曲线" % (place, x_data_year.values[0],
+                                                                     x_data_year.values[-1]), pos_left="center", pos_top="bottom"),
+            xaxis_opts=fragment('category_axis'),
             # y轴显示百分比，并设置最小值和最大值
             yaxis_opts=opts.AxisOpts(type_="value", max_=100, min_=10,
                                      axislabel_opts=opts.LabelOpts(formatter='{value} %')),
-            legend_opts=opts.LegendOpts(is_show=False),
+            legend_opts=fragment('hidden_legend'),
         )
-            .set_series_opts(label_opts=opts.LabelOpts(is_show=False))
+            .set_series_opts(label_opts=fragment('hidden_label'))
     )
 
     # 4、渲染图像，将多个图像显示在一个html中
@@ -336,18 +455,34 @@ def analysis_urbanization():
     page.add(pie)
     page.add(line1)
     page.add(line2)
-    page.render('population_urbanization.html')
+    return page
 
 
-def analysis_growth():
+def analysis_urbanization(path='population_urbanization.html', region=None, **render_options):
     """
-    分析人口增长率
+    分析我国人口城镇化
+    :param region: 地区名，默认为全国数据
+    :param render_options: 渲染参数，见 population_render.render_page
+    """
+    build_report('urbanization', prepare_urbanization, chart_urbanization, path, region, **render_options)
+
+
+def prepare_growth(df, region=None):
+    """
+    人口增长率数据处理
+    :param region: 地区名，用于图表标题，默认为全国数据
+    """
+    return {'period': period_title(place_name(region), df['年份'].values), 'x_data_year': df['年份'], 'y_data_birth': df['人口出生率(‰)'], 'y_data_death': df['人口死亡率(‰)'],
+            'y_data_growth': df['人口自然增长率(‰)']}
+
+
+def chart_growth(data):
     """
+    人口增长率图表
+    """
+    period, x_data_year, y_data_birth = data['period'], data['x_data_year'], data['y_data_birth']
+    y_data_death, y_data_growth = data['y_data_death'], data['y_data_growth']
     # 1、三条曲线
-    x_data_year = DF_STANDARD['年份']
-    y_data_birth = DF_STANDARD['人口出生率(‰)']
-    y_data_death = DF_STANDARD['人口死亡率(‰)']
-    y_data_growth = DF_STANDARD['人口自然增长率(‰)']
     line1 = (
         Line()
             .add_xaxis(x_data_year)
@@ -357,28 +492,70 @@ def analysis_growth():
             .set_global_opts(
             # y轴显示百分比，并设置最小值和最大值
             yaxis_opts=opts.AxisOpts(axislabel_opts=opts.LabelOpts(formatter='{value} ‰')),
-            title_opts=opts.TitleOpts(title="中国70年(1949-2019)出生率、死亡率及增长率变化", subtitle="1949-2019年，单位：‰",
+            title_opts=opts.TitleOpts(title="%s出生率、死亡率及增长率变化" % period,
+                                      subtitle="%d-%d年，单位：‰" % (x_data_year.values[0], x_data_year.values[-1]),
                                       pos_left="center",
                                       pos_top="bottom"),
-            xaxis_opts=opts.AxisOpts(type_="category"),
+            xaxis_opts=fragment('category_axis'),
         )
-            .set_series_opts(label_opts=opts.LabelOpts(is_show=False))
+            .set_series_opts(label_opts=fragment('hidden_label'))
     )
     # 2、渲染图像，将两个图像显示在一个html中
     page = Page(layout=Page.DraggablePageLayout)
     page.add(line1)
-    page.render('analysis_growth.html')
+    return page
 
 
-def analysis_age():
+def analysis_growth(path='analysis_growth.html', region=None, **render_options):
     """
-    分析年龄结构
+    分析人口增长率
+    :param region: 地区名，默认为全国数据
+    :param render_options: 渲染参数，见 population_render.render_page
+    """
+    build_report('growth', prepare_growth, chart_growth, path, region, **render_options)
+
+
+def prepare_age(df, region=None):
+    """
+    年龄结构数据处理
+    :param region: 地区名，用于图表标题，默认为全国数据
     """
-    new_df = DF_STANDARD[DF_STANDARD['0-14岁人口(万人)'] != 0][['年份', '0-14岁人口(万人)', '15-64岁人口(万人)', '65岁及以上人口(万人)']]
+    # 年龄结构，去掉没有数据的年份
+    new_df = df[df['0-14岁人口(万人)'].notna()][['年份'] + AGE_STRUCTURE_COLUMNS]
     x_data_year = new_df['年份']
     y_data_age_14 = new_df['0-14岁人口(万人)']
     y_data_age_15_64 = new_df['15-64岁人口(万人)']
     y_data_age_65 = new_df['65岁及以上人口(万人)']
+    # 有年龄结构数据的第一年与最近一年对比，全国数据为 1982 年与 2019 年
+    age_years = complete_years(df, AGE_STRUCTURE_COLUMNS)
+    age_first_year, age_last_year = int(age_years[0]), int(age_years[-1])
+    age_first = at_year(df, age_first_year, AGE_STRUCTURE_COLUMNS)
+    age_last = at_year(df, age_last_year, AGE_STRUCTURE_COLUMNS)
+    # 抚养比，去掉没有数据的年份
+    new_df = df[df['总抚养比(%)'].notna()][['年份', '总抚养比(%)', '少儿抚养比(%)', '老年抚养比(%)']]
+    x_data_year2 = new_df['年份']
+    y_data_all = new_df['总抚养比(%)']
+    y_data_new = new_df['少儿抚养比(%)']
+    y_data_old = new_df['老年抚养比(%)']
+    # 标记点在抚养比数据中的行号
+    events = year_positions(x_data_year2, DEPENDENCY_EVENTS)
+    return {'place': place_name(region), 'x_data_year': x_data_year, 'y_data_age_14': y_data_age_14,
+            'y_data_age_15_64': y_data_age_15_64, 'y_data_age_65': y_data_age_65, 'age_first_year': age_first_year,
+            'age_first': age_first, 'age_last_year': age_last_year, 'age_last': age_last, 'x_data_year2': x_data_year2,
+            'y_data_all': y_data_all, 'y_data_new': y_data_new, 'y_data_old': y_data_old, 'events': events}
+
+
+def chart_age(data):
+    """
+    年龄结构图表
+    """
+    place, x_data_year, y_data_age_14 = data['place'], data['x_data_year'], data['y_data_age_14']
+    y_data_age_15_64, y_data_age_65 = data['y_data_age_15_64'], data['y_data_age_65']
+    age_first_year, age_first, age_last_year, age_last = (data['age_first_year'], data['age_first'],
+                                                          data['age_last_year'], data['age_last'])
+    x_data_year2, y_data_all = data['x_data_year2'], data['y_data_all']
+    y_data_new, y_data_old, events = data['y_data_new'], data['y_data_old'], data['events']
+    # 1、年龄结构曲线
     line1 = (
         Line()
             .add_xaxis(x_data_year)
@@ -388,34 +565,31 @@ def analysis_age():
             .set_global_opts(
             # y轴显示百分比，并设置最小值和最大值
             yaxis_opts=opts.AxisOpts(axislabel_opts=opts.LabelOpts(formatter='{value}万')),
-            title_opts=opts.TitleOpts(title="中国人口年龄结构变化图（万人）",
+            title_opts=opts.TitleOpts(title="%s人口年龄结构变化图（万人）" % place,
                                       pos_left="center",
                                       pos_top="bottom"),
-            xaxis_opts=opts.AxisOpts(type_="category"),
+            xaxis_opts=fragment('category_axis'),
         )
-            .set_series_opts(label_opts=opts.LabelOpts(is_show=False))
+            .set_series_opts(label_opts=fragment('hidden_label'))
     )
-    # 2、1982年龄结构与2019年龄结构
-    age_1982 = DF_STANDARD[DF_STANDARD['年份'] == 1982][['0-14岁人口(万人)', '15-64岁人口(万人)', '65岁及以上人口(万人)']]
-    age_2019 = DF_STANDARD[DF_STANDARD['年份'] == 2019][['0-14岁人口(万人)', '15-64岁人口(万人)', '65岁及以上人口(万人)']]
-
+    # 2、第一年与最近一年的年龄结构
     pie = (
         Pie()
             .add(
-            "1982",
-            [list(z) for z in zip(['0-14', '15-64', '65'], np.ravel(age_1982.values))],
+            str(age_first_year),
+            [list(z) for z in zip(['0-14', '15-64', '65'], age_first)],
             center=["20%", "50%"],
             radius=[60, 80],
         )
             .add(
-            "2019",
-            [list(z) for z in zip(['0-14', '15-64', '65'], np.ravel(age_2019.values))],
+            str(age_last_year),
+            [list(z) for z in zip(['0-14', '15-64', '65'], age_last)],
             center=["55%", "50%"],
             radius=[60, 80],
         )
             .set_series_opts(label_opts=opts.LabelOpts(position="top", formatter="{b}: {d}%"))
             .set_global_opts(
-            title_opts=opts.TitleOpts(title="中国1982、2019年年龄结构对比图", pos_left="center",
+            title_opts=opts.TitleOpts(title="%s%d、%d年年龄结构对比图" % (place, age_first_year, age_last_year), pos_left="center",
                                       pos_top="bottom"),
             legend_opts=opts.LegendOpts(
                 type_="scroll", pos_top="20%", pos_left="80%", orient="vertical"
@@ -423,42 +597,485 @@ def analysis_age():
         )
     )
     # 3、抚养比曲线
-    new_df = DF_STANDARD[DF_STANDARD['总抚养比(%)'] != 0][['年份', '总抚养比(%)', '少儿抚养比(%)', '老年抚养比(%)']]
-    x_data_year2 = new_df['年份']
-    y_data_all = new_df['总抚养比(%)']
-    y_data_new = new_df['少儿抚养比(%)']
-    y_data_old = new_df['老年抚养比(%)']
     line2 = (
         Line()
             .add_xaxis(x_data_year2)
             .add_yaxis(series_name="总抚养比", y_axis=y_data_all, markpoint_opts=opts.MarkPointOpts(
-            data=[opts.MarkPointItem(name="1995年", coord=[22, y_data_all.values[22]],
-                                     value="%.2f" % (y_data_all.values[22]))
-                  ]
+            data=[opts.MarkPointItem(name=name, coord=[i, y_data_all.values[i]], value=round(y_data_all.values[i], 2))
+                  for name, i in events.items()]
         ))
             .add_yaxis("少儿抚养比", y_data_new)
             .add_yaxis("老年抚养比", y_data_old)
             .set_global_opts(
             # y轴显示百分比，并设置最小值和最大值
             yaxis_opts=opts.AxisOpts(axislabel_opts=opts.LabelOpts(formatter='{value}%')),
-            title_opts=opts.TitleOpts(title="中国抚养比变化曲线图",
+            title_opts=opts.TitleOpts(title="%s抚养比变化曲线图" % place,
                                       pos_left="center",
                                       pos_top="bottom"),
-            xaxis_opts=opts.AxisOpts(type_="category"),
+            xaxis_opts=fragment('category_axis'),
         )
-            .set_series_opts(label_opts=opts.LabelOpts(is_show=False))
+            .set_series_opts(label_opts=fragment('hidden_label'))
     )
     # 4、渲染图像，将两个图像显示在一个html中
     page = Page(layout=Page.DraggablePageLayout)
     page.add(line1)
     page.add(line2)
     page.add(pie)
-    page.render('analysis_age.html')
+    return page
+
+
+def analysis_age(path='analysis_age.html', region=None, **render_options):
+    """
+    分析年龄结构
+    :param region: 地区名，默认为全国数据
+    :param render_options: 渲染参数，见 population_render.render_page
+    """
+    build_report('age', prepare_age, chart_age, path, region, **render_options)
+
+
+def prepare_projection(df, region=None):
+    """
+    人口预测数据处理：历史数据接上预测的分位数，预测之前的年份为空值
+    :param region: 地区名，用于图表标题，默认为全国数据
+    """
+    inputs = projection_inputs(df)
+    summary = summarize(project(inputs, PROJECTION_YEARS, SCENARIOS))
+    start_year = inputs['year']
+    history_years = df['年份'].values[df['年份'].values <= start_year]
+    future_years = start_year + np.arange(PROJECTION_YEARS + 1)
+    # 历史和预测在起点年份相接
+    padding = np.full(len(history_years) - 1, np.nan)
+    y_data_history = to_yi(df['年末总人口(万人)'].values[:len(history_years)])
+    y_data_total = [np.concatenate([padding, to_yi(values)]) for values in summary['total']]
+    return {'place': place_name(region), 'start_year': start_year, 'x_data_year': np.concatenate([history_years, future_years[1:]]).tolist(),
+            'y_data_history': np.concatenate([y_data_history, np.full(PROJECTION_YEARS, np.nan)]),
+            'y_data_total': y_data_total, 'x_data_future': future_years.tolist(),
+            'y_data_age_14': np.round(summary['age_14'][1]), 'y_data_age_15_64': np.round(summary['age_15_64'][1]),
+            'y_data_age_65': np.round(summary['age_65'][1]), 'y_data_dependency': np.round(summary['dependency'], 2),
+            'y_data_old_dependency': np.round(summary['old_dependency'][1], 2)}
+
+
+def chart_projection(data):
+    """
+    人口预测图表
+    """
+    place, start_year, x_data_year = data['place'], data['start_year'], data['x_data_year']
+    y_data_history = data['y_data_history']
+    (y_data_low, y_data_median, y_data_high), x_data_future = data['y_data_total'], data['x_data_future']
+    y_data_age_14, y_data_age_15_64, y_data_age_65 = data['y_data_age_14'], data['y_data_age_15_64'], data['y_data_age_65']
+    (y_data_dependency_low, y_data_dependency, y_data_dependency_high) = data['y_data_dependency']
+    y_data_old_dependency = data['y_data_old_dependency']
+    end_year = start_year + PROJECTION_YEARS
+    dashed = opts.LineStyleOpts(type_='dashed')
+    # 1、总人口：历史曲线 + 预测中位数和 5%、95% 分位数
+    line1 = (
+        Line()
+            .add_xaxis(x_data_year)
+            .add_yaxis("历史总人口", y_data_history, is_symbol_show=False)
+            .add_yaxis("预测中位数", y_data_median, is_symbol_show=False)
+            .add_yaxis("预测5%分位", y_data_low, is_symbol_show=False, linestyle_opts=dashed)
+            .add_yaxis("预测95%分位", y_data_high, is_symbol_show=False, linestyle_opts=dashed)
+            .set_global_opts(
+            yaxis_opts=opts.AxisOpts(axislabel_opts=opts.LabelOpts(formatter='{value}亿'), min_='dataMin'),
+            title_opts=opts.TitleOpts(title="%s人口预测（%d-%d年）" % (place, start_year, end_year),
+                                      subtitle="%d个情景，单位：亿" % SCENARIOS, pos_left="center", pos_top="bottom"),
+            xaxis_opts=fragment('category_axis'),
+        )
+            .set_series_opts(label_opts=fragment('hidden_label'))
+    )
+    # 2、各年龄段人口预测中位数
+    line2 = (
+        Line()
+            .add_xaxis(x_data_future)
+            .add_yaxis("0-14岁人口", y_data_age_14)
+            .add_yaxis("15-64", y_data_age_15_64)
+            .add_yaxis("65岁及以上人口", y_data_age_65)
+            .set_global_opts(
+            yaxis_opts=opts.AxisOpts(axislabel_opts=opts.LabelOpts(formatter='{value}万')),
+            title_opts=opts.TitleOpts(title="%s人口年龄结构预测（万人，中位数）" % place, pos_left="center", pos_top="bottom"),
+            xaxis_opts=fragment('category_axis'),
+        )
+            .set_series_opts(label_opts=fragment('hidden_label'))
+    )
+    # 3、抚养比预测
+    line3 = (
+        Line()
+            .add_xaxis(x_data_future)
+            .add_yaxis("总抚养比", y_data_dependency)
+            .add_yaxis("总抚养比5%分位", y_data_dependency_low, is_symbol_show=False, linestyle_opts=dashed)
+            .add_yaxis("总抚养比95%分位", y_data_dependency_high, is_symbol_show=False, linestyle_opts=dashed)
+            .add_yaxis("老年抚养比", y_data_old_dependency)
+            .set_global_opts(
+            yaxis_opts=opts.AxisOpts(axislabel_opts=opts.LabelOpts(formatter='{value}%')),
+            title_opts=opts.TitleOpts(title="%s抚养比预测曲线图" % place, pos_left="center", pos_top="bottom"),
+            xaxis_opts=fragment('category_axis'),
+        )
+            .set_series_opts(label_opts=fragment('hidden_label'))
+    )
+    # 4、渲染图像，将三个图像显示在一个html中
+    page = Page(layout=Page.DraggablePageLayout)
+    page.add(line1)
+    page.add(line2)
+    page.add(line3)
+    return page
+
+
+def analysis_projection(path='analysis_projection.html', region=None, **render_options):
+    """
+    人口预测
+    :param region: 地区名，默认为全国数据
+    :param render_options: 渲染参数，见 population_render.render_page
+    """
+    build_report('projection', prepare_projection, chart_projection, path, region, **render_options)
+
+
+# 所有报告，key 为命令行中使用的报告名
+# function：生成报告的函数，prepare：数据处理，chart：生成图表，output：输出文件，columns：报告读取的数据列，
+# years：报告需要的年份，snapshot：饼图使用的列，至少有一年这些列都有数据（饼图使用最近一年），
+# modules：报告额外依赖的模块名，constants：报告使用的模块常量名（代码或者常量变化后需要重新渲染）
+REPORTS = {
+    'total': {
+        'function': analysis_total,
+        'prepare': prepare_total,
+        'chart': chart_total,
+        'output': 'population_total.html',
+        'columns': ['年份', '年末总人口(万人)'],
+        'years': [],
+        'constants': ['TOTAL_EVENTS'],
+    },
+    'sex': {
+        'function': analysis_sex,
+        'prepare': prepare_sex,
+        'chart': chart_sex,
+        'output': 'population_sex.html',
+        'columns': ['年份', '年末总人口(万人)', '男性人口(万人)', '女性人口(万人)'],
+        'years': [],
+        'snapshot': ['男性人口(万人)', '女性人口(万人)'],
+    },
+    'urbanization': {
+        'function': analysis_urbanization,
+        'prepare': prepare_urbanization,
+        'chart': chart_urbanization,
+        'output': 'population_urbanization.html',
+        'columns': ['年份', '年末总人口(万人)', '城镇人口(万人)', '乡村人口(万人)'],
+        'years': [],
+        'snapshot': ['城镇人口(万人)', '乡村人口(万人)'],
+        'constants': ['URBANIZATION_EVENTS'],
+    },
+    'growth': {
+        'function': analysis_growth,
+        'prepare': prepare_growth,
+        'chart': chart_growth,
+        'output': 'analysis_growth.html',
+        'columns': ['年份', '人口出生率(‰)', '人口死亡率(‰)', '人口自然增长率(‰)'],
+        'years': [],
+    },
+    'age': {
+        'function': analysis_age,
+        'prepare': prepare_age,
+        'chart': chart_age,
+        'output': 'analysis_age.html',
+        'columns': ['年份'] + AGE_STRUCTURE_COLUMNS + ['总抚养比(%)', '少儿抚养比(%)', '老年抚养比(%)'],
+        'years': [],
+        'snapshot': AGE_STRUCTURE_COLUMNS,
+        'constants': ['AGE_STRUCTURE_COLUMNS', 'DEPENDENCY_EVENTS'],
+    },
+    'projection': {
+        'function': analysis_projection,
+        'prepare': prepare_projection,
+        'chart': chart_projection,
+        'output': 'analysis_projection.html',
+        'columns': ['年份', '年末总人口(万人)'] + AGE_COLUMNS + RATE_COLUMNS,
+        'years': [],
+        'modules': ['population_projection'],
+    },
+}
+
+
+def data_hash(df, columns):
+    """
+    报告读取的数据列的 hash，其它列变化不影响结果
+    """
+    sha1 = hashlib.sha1(json.dumps(columns, ensure_ascii=False).encode('utf-8'))
+    sha1.update(pd.util.hash_pandas_object(df[columns], index=False).values.tobytes())
+    return sha1.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def config_hash(name):
+    """
+    报告图表配置的 hash，生成报告的函数代码、公共样式、派生指标或者报告使用的常量变化后需要重新渲染
+    同一进程内代码不会变化，每个报告只计算一次
+    """
+    sha1 = hashlib.sha1()
+    for function in [REPORTS[name][key] for key in ('function', 'prepare', 'chart')] + \
+            [globals()[function] for function in CONFIG_FUNCTIONS]:
+        sha1.update(inspect.getsource(function).encode('utf-8'))
+    for module in CONFIG_MODULES + REPORTS[name].get('modules', []):
+        sha1.update(inspect.getsource(importlib.import_module(module)).encode('utf-8'))
+    for constant in REPORTS[name].get('constants', []):
+        sha1.update(('%s=%r' % (constant, globals()[constant])).encode('utf-8'))
+    return sha1.hexdigest()
+
+
+def load_manifest(path=BUILD_MANIFEST_PATH):
+    """
+    读取构建记录，文件不存在或者损坏时返回空记录
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
+
+
+def save_manifest(manifest, path=BUILD_MANIFEST_PATH):
+    """
+    保存构建记录，先写临时文件再替换
+    """
+    with atomic_open(path) as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def report_key(name, region=None):
+    """
+    报告在构建记录和渲染结果中的名称，分地区报告为 地区/报告名
+    """
+    return name if region is None else '%s/%s' % (region, name)
+
+
+def report_output(name, region=None):
+    """
+    报告的输出路径，分地区报告放在 REGION_OUTPUT_DIR/地区 目录下
+    """
+    output = REPORTS[name]['output']
+    return output if region is None else os.path.join(REGION_OUTPUT_DIR, region, output)
+
+
+def missing_requirements(name, df):
+    """
+    数据中缺少的报告需要的列和年份，分地区数据的指标和年份比全国数据少
+    :return: 缺少的内容列表，例如 ['1949年', '男性人口(万人)']，数据齐全时为空列表
+    """
+    report = REPORTS[name]
+    missing = [column for column in report['columns'] if column not in df.columns]
+    if missing:
+        return missing
+    years = report['years']
+    found = year_positions(df['年份'], dict(zip(years, years)))
+    missing = ['%d年' % year for year in years if year not in found]
+    snapshot = report.get('snapshot', [])
+    if snapshot and not len(complete_years(df, snapshot)):
+        missing.append('同一年的%s' % '、'.join(snapshot))
+    return missing
+
+
+def report_available(name, df):
+    """
+    数据中是否有报告需要的列和年份
+    """
+    return not missing_requirements(name, df)
+
+
+def report_tasks(names, regions=None):
+    """
+    需要渲染的 (报告名, 地区) 列表，regions 为 None 时只渲染全国报告，数据不足的地区报告跳过，见 skipped_tasks
+    """
+    if regions is None:
+        return [(name, None) for name in names]
+    return [(name, region) for region in regions for name in names
+            if report_available(name, get_region_dataset(region))]
+
+
+def skipped_tasks(names, regions=None):
+    """
+    数据不足而跳过的地区报告
+    :return: [(报告名, 地区, 缺少的内容列表)]
+    """
+    if regions is None:
+        return []
+    skipped = [(name, region, missing_requirements(name, get_region_dataset(region)))
+               for region in regions for name in names]
+    return [(name, region, missing) for name, region, missing in skipped if missing]
+
+
+def build_record(name, df, render_options, region=None):
+    """
+    报告当前的构建记录
+    """
+    report = REPORTS[name]
+    return {
+        'output': report_output(name, region),
+        'data': data_hash(df, report['columns']),
+        'config': config_hash(name),
+        'render': render_options,
+    }
+
+
+def stale_reports(tasks, manifest, render_options):
+    """
+    需要重新渲染的报告：没有记录、输出文件不存在、读取的数据、图表配置或渲染参数有变化
+    :param tasks: (报告名, 地区) 列表
+    """
+    return [(name, region) for name, region in tasks
+            if manifest.get(report_key(name, region)) != build_record(name, report_dataset(region), render_options, region)
+            or not os.path.exists(report_output(name, region))]
+
+
+def changed_tasks(tasks, changed):
+    """
+    只保留用到变化指标的报告
+    :param changed: {地区: 指标集合}，见 population_changes.changed_indicators
+    """
+    return [(name, region) for name, region in tasks if changed.get(region, set()) & set(REPORTS[name]['columns'])]
+
+
+def tasks_with_changes(tasks, path, cursors):
+    """
+    从每个报告自己的读取位置读取变化记录，只保留用到变化指标的报告
+    :param cursors: {报告: 读取到的位置}，只更新 tasks 中的报告，没有检查的报告下次仍从原来的位置读取
+    """
+    # 读取位置相同的报告一起检查，一般只有一两个不同的位置
+    groups = {}
+    for name, region in tasks:
+        groups.setdefault(cursors.get(report_key(name, region), 0), []).append((name, region))
+    selected = set()
+    for offset, group in groups.items():
+        records, end = read_changes(path, offset)
+        selected.update(changed_tasks(group, changed_indicators(records)))
+        for name, region in group:
+            cursors[report_key(name, region)] = end
+    # 保持 tasks 原来的顺序
+    return [task for task in tasks if task in selected]
+
+
+def _init_worker(df, region_store=None):
+    """
+    子进程初始化，使用主进程读取好的数据
+    df 为 None 时子进程自己映射缓存文件，和主进程共用同一份内存页
+    """
+    if df is not None:
+        set_dataset(df)
+    if region_store is not None:
+        set_region_store(region_store)
+
+
+def _render_report(task, render_options):
+    """
+    渲染单个报告，返回耗时（秒）
+    """
+    name, region = task
+    output = report_output(name, region)
+    if region is not None:
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    start = time.perf_counter()
+    with span('report', report=name, region=region):
+        REPORTS[name]['function'](output, region=region, **render_options)
+    return time.perf_counter() - start
+
+
+@traced('report.render_reports')
+def render_reports(names, jobs=None, force=False, regions=None, changes=None, **render_options):
+    """
+    使用进程池并行渲染多个报告，只渲染过期的报告
+    :param names: 报告名列表
+    :param jobs: 进程数，默认为 cpu 核数，1 表示在当前进程中依次渲染
+    :param force: 忽略构建记录，全部重新渲染
+    :param regions: 地区名列表，指定时渲染这些地区的报告，而不是全国报告
+    :param changes: 变化记录文件，指定时只检查上次渲染之后数据有变化的报告，见 population_changes
+    :param render_options: 渲染参数，见 population_render.render_page
+    :return: {报告名: 耗时（秒）}，分地区报告的名称为 地区/报告名，没有重新渲染的报告不在结果中
+    """
+    # 数据只在主进程中读取一次，再传给子进程
+    df = get_dataset()
+    region_store = None if regions is None else get_region_store()
+    tasks = report_tasks(names, regions)
+    manifest = load_manifest()
+    if changes is not None:
+        cursors = manifest.setdefault(CHANGES_CURSOR_KEY, {}).setdefault(changes, {})
+        tasks = tasks_with_changes(tasks, changes, cursors)
+    if not force:
+        with span('report.stale_check'):
+            tasks = stale_reports(tasks, manifest, render_options)
+    if not tasks:
+        if changes is not None:
+            save_manifest(manifest)
+        return {}
+
+    jobs = min(jobs or os.cpu_count() or 1, len(tasks))
+    if jobs <= 1:
+        timings = [_render_report(task, render_options) for task in tasks]
+    else:
+        # 分地区报告数量多，每次给子进程分配一批，减少进程间通信
+        chunksize = max(1, len(tasks) // (jobs * 4))
+        shared_df = None if is_mapped(df) else df
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(shared_df, region_store)) as executor:
+            timings = list(executor.map(_render_report, tasks, [render_options] * len(tasks), chunksize=chunksize))
+
+    for name, region in tasks:
+        manifest[report_key(name, region)] = build_record(name, report_dataset(region), render_options, region)
+    save_manifest(manifest)
+    return {report_key(name, region): timing for (name, region), timing in zip(tasks, timings)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m population_analysis', description='生成人口分析报告')
+    subparsers = parser.add_subparsers(dest='command')
+    render_parser = subparsers.add_parser('render', help='渲染报告')
+    render_parser.add_argument('reports', nargs='*', metavar='report',
+                               help='需要渲染的报告：%s' % ', '.join(REPORTS))
+    render_parser.add_argument('--all', action='store_true', help='渲染所有报告')
+    render_parser.add_argument('--jobs', '-j', type=int, default=None, help='并行进程数，默认为 cpu 核数')
+    render_parser.add_argument('--force', action='store_true', help='忽略构建记录，全部重新渲染')
+    render_parser.add_argument('--js-host', default=None,
+                               help='js 文件地址前缀，本地目录（例如 assets/）会下载一份 js 文件供所有页面共用')
+    render_parser.add_argument('--region', action='append', dest='regions', metavar='REGION',
+                               help='渲染该地区的报告，可以指定多次，all 表示所有地区；输出到 %s/地区/' % REGION_OUTPUT_DIR)
+    render_parser.add_argument('--changes', nargs='?', const=CHANGE_LOG_PATH, default=None, metavar='PATH',
+                               help='只渲染上次渲染之后数据有变化的报告，变化记录默认为 %s' % CHANGE_LOG_PATH)
+    render_parser.add_argument('--trace', default=None, metavar='PATH',
+                               help='记录各阶段耗时和内存变化，.prom 结尾为 Prometheus 文本格式，否则为 JSON lines')
+    render_parser.add_argument('--profile-dir', default=None,
+                               help='每个报告的 cProfile/tracemalloc 结果保存到该目录，需要同时指定 --trace')
+    args = parser.parse_args(argv)
+
+    if args.command != 'render':
+        parser.print_help()
+        return 1
+    names = list(REPORTS) if args.all else list(dict.fromkeys(args.reports))
+    if not names:
+        render_parser.error('请指定报告名或者使用 --all')
+    unknown = [name for name in names if name not in REPORTS]
+    if unknown:
+        render_parser.error('未知的报告：%s，可选：%s' % (', '.join(unknown), ', '.join(REPORTS)))
+
+    if args.trace:
+        enable_trace(args.trace, args.profile_dir)
+    elif args.profile_dir:
+        render_parser.error('--profile-dir 需要同时指定 --trace')
+
+    regions = args.regions
+    if regions and 'all' in regions:
+        regions = region_names()
+
+    start = time.perf_counter()
+    render_options = {}
+    if args.js_host:
+        render_options['js_host'] = args.js_host
+    timings = render_reports(names, jobs=args.jobs, force=args.force, regions=regions, changes=args.changes,
+                             **render_options)
+    for name, region in report_tasks(names, regions):
+        key = report_key(name, region)
+        if key in timings:
+            print('%-14s %8.3fs' % (key, timings[key]))
+        else:
+            print('%-14s %9s' % (key, 'up to date'))
+    for name, region, missing in skipped_tasks(names, regions):
+        print('%-14s %9s  缺少：%s' % (report_key(name, region), 'skipped', '，'.join(missing)))
+    print('%-14s %8.3fs' % ('(all)', time.perf_counter() - start))
+    return 0
 
 
 if __name__ == '__main__':
-    # analysis_total()
-    # analysis_sex()
-    # analysis_urbanization()
-    # analysis_growth()
-    analysis_age()
+    raise SystemExit(main())
@@ -0,0 +1,344 @@
+"""
+性能测试：分别统计 读取数据（excel / 二进制文件） → 数据处理 → 生成图表 → 渲染html 各个阶段的耗时和内存
+除了真实的 population.xlsx，还可以生成指定行数的模拟数据测试数据量变大后的表现
+结果保存为 json，可以和上一次的结果比较，发现性能退化
+
+python population_bench.py --sizes 10000,100000,1000000 --output population_bench.json
+python population_bench.py --compare population_bench.json
+
+获取详细教程、获取代码帮助、提出意见建议
+关注微信公众号「裸睡的猪」与猪哥联系
+
+@Author  :   猪哥
+
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pyecharts
+
+import population_data
+import population_indicators
+import population_spider
+import population_theme
+from population_analysis import REPORTS
+from population_render import render_page
+from population_trace import current_rss_mb
+
+# 默认的模拟数据行数
+SYNTHETIC_SIZES = [10000, 100000, 1000000]
+# 每个阶段重复次数，耗时取最小值
+REPEAT = 3
+# 超过这个行数的模拟数据不测试读取excel（生成excel本身就很慢）
+MAX_LOAD_ROWS = 100000
+# 测试解析接口响应的数据节点数
+PARSE_SIZES = [10000, 100000]
+# 模拟接口响应中的指标数
+PARSE_INDICATORS = 20
+# 结果保存路径
+BENCH_OUTPUT_PATH = 'population_bench.json'
+# 耗时超过上次结果的倍数时认为性能退化
+REGRESSION_THRESHOLD = 1.2
+
+# 在新进程中读取数据，统计读取前后的常驻内存，不受本进程之前运行的影响
+_LOAD_SCRIPT = """
+import json, sys, time
+import pandas as pd
+import population_bench, population_data
+method, path = sys.argv[1:3]
+before = population_bench.current_rss_mb()
+start = time.perf_counter()
+df = pd.read_excel(path) if method == 'read_excel' else population_data.read_binary(path)
+population_bench.touch(df)
+elapsed = time.perf_counter() - start
+after = population_bench.current_rss_mb()
+print(json.dumps({'process_load_s': elapsed, 'process_rss_mb': None if before is None else after - before}))
+"""
+
+
+def result_line(label, result):
+    """
+    一个阶段的结果：耗时、分配内存峰值、常驻内存变化
+    """
+    rss = '%+9.2fMB' % result['rss_delta_mb'] if result.get('rss_delta_mb') is not None else '%11s' % '-'
+    return '%-18s %-10s %-14s %9.4fs %9.2fMB %s' % (label, result['stage'], result['step'], result['wall_s'],
+                                                   result['alloc_peak_mb'], rss)
+
+
+def touch(df):
+    """
+    读取每一列的全部数据，映射的文件只有访问时才会真正读入内存
+    """
+    return sum(float(df[column].values.sum()) for column in df.columns)
+
+
+def measure(func, setup=None, repeat=REPEAT):
+    """
+    统计一个阶段的耗时和内存
+    :param func: 需要统计的函数，参数为 setup 的返回值
+    :param setup: 每次运行前的准备工作，不计入耗时
+    :return: 统计结果和最后一次运行的返回值
+    """
+    times = []
+    result = None
+    rss_delta = None
+    for i in range(repeat):
+        args = setup() if setup else ()
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+        result = func(*args)
+        times.append(time.perf_counter() - start)
+        # 常驻内存只统计第一次运行的变化，之后的运行可能复用已经分配的内存
+        if i == 0 and rss_before is not None:
+            rss_delta = current_rss_mb() - rss_before
+
+    # 单独运行一次统计内存分配，tracemalloc 会拖慢运行，不和耗时一起统计
+    args = setup() if setup else ()
+    tracemalloc.start()
+    try:
+        func(*args)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'wall_s': min(times),
+        'wall_mean_s': sum(times) / len(times),
+        'alloc_peak_mb': peak / (1024 * 1024),
+        'alloc_net_mb': current / (1024 * 1024),
+        'rss_delta_mb': rss_delta,
+    }, result
+
+
+def synthetic_dataset(rows, seed=0):
+    """
+    生成 rows 行的模拟数据，相当于多个地区 × 历年数据
+    以真实数据为模板重复填充，数值加上随机波动，年份连续递增
+    """
+    template = population_data.get_dataset()
+    rng = np.random.default_rng(seed)
+    index = np.arange(rows) % len(template)
+    df = template.iloc[index].reset_index(drop=True)
+    columns = [column for column in df.columns if column != '年份']
+    noise = rng.uniform(0.9, 1.1, size=(rows, len(columns)))
+    df[columns] = df[columns].values * noise
+    df['年份'] = template['年份'].iloc[0] + np.arange(rows)
+    return df
+
+
+def process_load(method, path):
+    """
+    在新进程中读取一次数据，返回耗时和常驻内存增量
+    :param method: read_excel 或 binary
+    """
+    result = subprocess.run([sys.executable, '-c', _LOAD_SCRIPT, method, os.path.abspath(path)],
+                            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def bench_load(df, output_dir, excel_path=None, repeat=REPEAT):
+    """
+    读取阶段：直接解析 excel 和映射二进制文件，读取后访问全部数据
+    """
+    results = []
+    if excel_path:
+        stats, _ = measure(lambda: touch(pd.read_excel(excel_path)), repeat=repeat)
+        stats.update(process_load('read_excel', excel_path))
+        results.append(dict(stage='load', step='read_excel', **stats))
+    binary_path = os.path.join(output_dir, 'dataset_%d.bin' % len(df))
+    population_data.export_binary(df, binary_path)
+    stats, _ = measure(lambda: touch(population_data.read_binary(binary_path)), repeat=repeat)
+    stats.update(process_load('binary', binary_path))
+    results.append(dict(stage='load', step='binary', **stats))
+    return results
+
+
+def synthetic_payload(nodes, path, indicators=PARSE_INDICATORS):
+    """
+    生成 nodes 个数据节点的模拟接口响应，结构与真实接口相同，逐个节点写入文件
+    """
+    years = max(-(-nodes // indicators), 1)
+    codes = ['A%06d' % i for i in range(indicators)]
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"returncode": 200, "returndata": {"datanodes": [')
+        for i in range(nodes):
+            code, year = codes[i % indicators], 1000 + i // indicators
+            node = {'code': 'zb.%s_sj.%d' % (code, year),
+                    'data': {'data': i * 0.5, 'dotcount': 2, 'hasdata': True, 'strdata': '%.2f' % (i * 0.5)},
+                    'wds': [{'valuecode': code, 'wdcode': 'zb'}, {'valuecode': str(year), 'wdcode': 'sj'}]}
+            f.write((',' if i else '') + json.dumps(node))
+        wdnodes = [{'wdcode': 'zb', 'nodes': [{'code': code, 'cname': code, 'unit': '万人'} for code in codes]},
+                   {'wdcode': 'sj', 'nodes': [{'code': str(1000 + i), 'cname': '%d年' % (1000 + i)} for i in range(years)]}]
+        f.write('], "freshsort": 0, "hasdatacount": %d, "wdnodes": %s}}' % (nodes, json.dumps(wdnodes)))
+
+
+def bench_parse(nodes, output_dir, repeat=REPEAT):
+    """
+    解析接口响应：整个响应转换为 json 对象后处理，和边读取边解析，比较内存占用和响应大小的关系
+    """
+    path = os.path.join(output_dir, 'payload_%d.json' % nodes)
+    synthetic_payload(nodes, path)
+    payload_mb = os.path.getsize(path) / (1024 * 1024)
+
+    def parse_json():
+        with open(path, 'rb') as f:
+            return population_spider.get_population_info(json.load(f))
+
+    def parse_stream():
+        with open(path, 'rb') as f:
+            return population_spider.read_population_info(f)
+
+    results = []
+    for step, func in (('json', parse_json), ('stream', parse_stream)):
+        stats, _ = measure(func, repeat=repeat)
+        results.append(dict(stage='parse', step=step, dataset='payload-%d' % nodes, rows=nodes,
+                            payload_mb=payload_mb, **stats))
+    for result in results:
+        print(result_line(result['dataset'], result))
+    os.remove(path)
+    return results
+
+
+def bench_report(name, df, output_dir, repeat=REPEAT):
+    """
+    单个报告的 数据处理、生成图表、生成配置json、渲染html 各阶段
+    """
+    report = REPORTS[name]
+    results = []
+    stats, data = measure(lambda: report['prepare'](df), repeat=repeat)
+    results.append(dict(stage='transform', step=name, **stats))
+    stats, page = measure(lambda: report['chart'](data), repeat=repeat)
+    results.append(dict(stage='build', step=name, **stats))
+    stats, _ = measure(lambda: [population_theme.dump_options(chart) for chart in page], repeat=repeat)
+    results.append(dict(stage='options', step=name, **stats))
+    # Page 只能渲染一次，每次渲染前重新生成图表
+    output = os.path.join(output_dir, report['output'])
+    stats, _ = measure(lambda p: render_page(p, output), setup=lambda: (report['chart'](data),), repeat=repeat)
+    stats['output_bytes'] = os.path.getsize(output)
+    results.append(dict(stage='render', step=name, **stats))
+    return results
+
+
+def bench_dataset(label, df, names, output_dir, excel_path=None, repeat=REPEAT):
+    """
+    测试一个数据集的所有阶段
+    """
+    results = bench_load(df, output_dir, excel_path=excel_path, repeat=repeat)
+    # 所有派生指标一次计算，之后各个报告的数据处理直接使用缓存
+    stats, _ = measure(lambda: population_indicators.compute_indicators(df), repeat=repeat)
+    results.append(dict(stage='indicators', step='all', **stats))
+    for name in names:
+        results.extend(bench_report(name, df, output_dir, repeat=repeat))
+    for result in results:
+        result.update(dataset=label, rows=len(df))
+        print(result_line(label, result))
+    return results
+
+
+def run(sizes=None, names=None, repeat=REPEAT, max_load_rows=MAX_LOAD_ROWS, real=True, parse_sizes=None):
+    """
+    运行所有测试
+    """
+    sizes = SYNTHETIC_SIZES if sizes is None else sizes
+    parse_sizes = PARSE_SIZES if parse_sizes is None else parse_sizes
+    names = list(REPORTS) if names is None else names
+    results = []
+    output_dir = tempfile.mkdtemp(prefix='population_bench_')
+    try:
+        if real:
+            df = population_data.get_dataset()
+            results.extend(bench_dataset('population.xlsx', df, names, output_dir,
+                                         excel_path=population_data.POPULATION_EXCEL_PATH, repeat=repeat))
+        for rows in sizes:
+            df = synthetic_dataset(rows)
+            excel_path = None
+            if rows <= max_load_rows:
+                excel_path = os.path.join(output_dir, 'synthetic_%d.xlsx' % rows)
+                df.to_excel(excel_path, index=False)
+            results.extend(bench_dataset('synthetic-%d' % rows, df, names, output_dir,
+                                         excel_path=excel_path, repeat=repeat))
+        for nodes in parse_sizes:
+            results.extend(bench_parse(nodes, output_dir, repeat=repeat))
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    return {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'pyecharts': pyecharts.__version__,
+            'ijson': getattr(population_spider.ijson, '__version__', None),
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def compare(old, new, threshold=REGRESSION_THRESHOLD):
+    """
+    与上一次的结果比较，返回耗时超过 threshold 倍的阶段
+    """
+    old_results = {(r['dataset'], r['stage'], r['step']): r for r in old['results']}
+    regressions = []
+    for result in new['results']:
+        key = (result['dataset'], result['stage'], result['step'])
+        previous = old_results.get(key)
+        if previous and previous['wall_s'] > 0 and result['wall_s'] / previous['wall_s'] > threshold:
+            regressions.append((key, previous['wall_s'], result['wall_s']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='人口分析性能测试')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in SYNTHETIC_SIZES),
+                        help='模拟数据行数，逗号分隔，为空时只测试真实数据')
+    parser.add_argument('--reports', default=','.join(REPORTS), help='需要测试的报告，逗号分隔')
+    parser.add_argument('--parse-sizes', default=','.join(str(size) for size in PARSE_SIZES),
+                        help='测试解析接口响应的数据节点数，逗号分隔，为空时不测试')
+    parser.add_argument('--repeat', type=int, default=REPEAT, help='每个阶段重复次数')
+    parser.add_argument('--max-load-rows', type=int, default=MAX_LOAD_ROWS, help='超过这个行数的模拟数据不测试读取excel')
+    parser.add_argument('--no-real', action='store_true', help='不测试真实数据')
+    parser.add_argument('--output', default=BENCH_OUTPUT_PATH, help='结果保存路径')
+    parser.add_argument('--compare', help='与之前保存的结果比较')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD, help='耗时超过上次结果的倍数时认为性能退化')
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    parse_sizes = [int(size) for size in args.parse_sizes.split(',') if size]
+    names = [name for name in args.reports.split(',') if name]
+    unknown = [name for name in names if name not in REPORTS]
+    if unknown:
+        parser.error('未知的报告：%s' % ', '.join(unknown))
+
+    # 先读取比较的结果，output 和 compare 可以是同一个文件
+    old = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            old = json.load(f)
+
+    report = run(sizes=sizes, names=names, repeat=args.repeat, max_load_rows=args.max_load_rows, real=not args.no_real,
+                 parse_sizes=parse_sizes)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if old is not None:
+        regressions = compare(old, report, args.threshold)
+        for (dataset, stage, step), before, after in regressions:
+            print('性能退化：%s %s %s %.4fs -> %.4fs' % (dataset, stage, step, before, after))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
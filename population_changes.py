@@ -0,0 +1,193 @@
+"""
+数据变化记录
+国家统计局会修订往年的数据，爬虫保存数据前把新数据和已保存的数据按 (年份, 指标) 对齐后整表比较，
+变化的格追加到 population_changes.jsonl 中，每次保存一行：
+{"time": 时间, "dataset": 数据文件, "previous": 保存前的文件版本, "version": 保存后的文件版本,
+ "counts": {"added": 新增, "revised": 修订, "removed": 删除},
+ "fields": ["year", "indicator", "old", "new"], "cells": [[2018, "年末总人口(万人)", 139538.0, 139540.0], ...],
+ "rows": {"added": [新增的年份], "removed": [删除的年份]}}
+分地区数据的 fields 前面多一个 region，rows 中为 [地区, 年份]，没有数据的值为 null
+增删年份会改变所有图表的横轴，相当于该地区的 年份 列有变化
+渲染报告（render --changes）和报告服务根据变化的指标只重新渲染受影响的报告
+
+获取详细教程、获取代码帮助、提出意见建议
+关注微信公众号「裸睡的猪」与猪哥联系
+
+@Author  :   猪哥
+
+"""
+import json
+import os
+import time
+
+import numpy as np
+
+from population_data import file_version
+
+# 变化记录文件
+CHANGE_LOG_PATH = 'population_changes.jsonl'
+# 两个数值的相对差小于这个值时认为没有变化，避免浮点数读写产生的误差
+RELATIVE_TOLERANCE = 1e-9
+# 变化类型：新增（原来没有数据）、修订、删除（现在没有数据）
+CHANGE_KINDS = ('added', 'revised', 'removed')
+
+
+def dataset_table(df):
+    """
+    全国数据转换为比较用的表：行为年份，列为指标
+    """
+    return df.set_index('年份').rename_axis('year')
+
+
+def region_table(store):
+    """
+    分地区长表转换为比较用的表：行为 (地区, 年份)，列为指标
+    """
+    store = store.assign(region=store['region'].astype(str), indicator=store['indicator'].astype(str))
+    table = store.set_index(['region', 'year', 'indicator'])['value'].unstack('indicator')
+    table.columns.name = None
+    return table
+
+
+def diff_tables(old, new):
+    """
+    两张表对齐行和列后逐格比较
+    :param old: 原来的表，None 表示没有原来的数据
+    :return: 变化的格，列为 行索引的各级（year 或 region、year）、indicator、old、new、kind
+    """
+    if old is None:
+        old = new.iloc[:0]
+    index = old.index.union(new.index)
+    columns = old.columns.union(new.columns)
+    old_values = old.reindex(index=index, columns=columns).to_numpy(dtype=np.float64)
+    new_values = new.reindex(index=index, columns=columns).to_numpy(dtype=np.float64)
+    old_missing = np.isnan(old_values)
+    new_missing = np.isnan(new_values)
+    with np.errstate(invalid='ignore'):
+        revised = np.abs(old_values - new_values) > RELATIVE_TOLERANCE * np.maximum(np.abs(old_values),
+                                                                                   np.abs(new_values))
+    changed = (old_missing != new_missing) | (~old_missing & ~new_missing & revised)
+    rows, cols = np.nonzero(changed)
+
+    changes = index[rows].to_frame(index=False)
+    changes['indicator'] = columns[cols]
+    changes['old'] = old_values[rows, cols]
+    changes['new'] = new_values[rows, cols]
+    changes['kind'] = np.where(old_missing[rows, cols], 'added', np.where(new_missing[rows, cols], 'removed', 'revised'))
+    return changes
+
+
+def diff_rows(old, new):
+    """
+    新增和删除的行
+    :return: (新增的行索引, 删除的行索引)
+    """
+    if old is None:
+        return new.index, new.index[:0]
+    return new.index.difference(old.index), old.index.difference(new.index)
+
+
+def change_record(dataset, changes, rows=None, previous=None, version=None):
+    """
+    一次保存的变化记录，见模块说明
+    :param rows: diff_rows 的结果
+    :param previous: 保存前的文件版本，None 表示原来没有文件
+    :param version: 保存后的文件版本
+    """
+    fields = [column for column in changes.columns if column != 'kind']
+    cells = changes[fields].astype(object).where(changes[fields].notna(), None).values.tolist()
+    counts = changes['kind'].value_counts()
+    return {
+        'time': time.time(),
+        'dataset': os.path.basename(dataset),
+        'previous': previous,
+        'version': version,
+        'counts': {kind: int(counts.get(kind, 0)) for kind in CHANGE_KINDS},
+        'fields': fields,
+        'cells': [[_json_value(value) for value in cell] for cell in cells],
+        'rows': {kind: [_json_value(list(row)) if isinstance(row, tuple) else _json_value(row) for row in index]
+                 for kind, index in zip(('added', 'removed'), rows or ([], []))},
+    }
+
+
+def _json_value(value):
+    # numpy 的数值转换为 python 的数值
+    if isinstance(value, list):
+        return [_json_value(item) for item in value]
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def append_changes(record, path=CHANGE_LOG_PATH):
+    """
+    追加一条变化记录，一次写入一整行
+    """
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def record_changes(dataset, old_table, new_table, previous, path=CHANGE_LOG_PATH):
+    """
+    数据文件保存后调用：比较保存前后的数据并追加变化记录，没有变化时也记录一行，使文件版本前后相接
+    :param previous: 保存前的文件版本
+    :return: 变化的格，见 diff_tables
+    """
+    changes = diff_tables(old_table, new_table)
+    rows = diff_rows(old_table, new_table)
+    append_changes(change_record(dataset, changes, rows, previous, file_version(dataset)), path)
+    return changes
+
+
+def read_changes(path=CHANGE_LOG_PATH, offset=0):
+    """
+    读取 offset 字节之后的变化记录，没有写完的最后一行不读取；文件比 offset 短（重新创建过）时从头读取
+    :return: (记录列表, 读取到的位置)，下次从该位置继续读取
+    """
+    records = []
+    try:
+        with open(path, 'rb') as f:
+            if offset > os.fstat(f.fileno()).st_size:
+                offset = 0
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                offset += len(line)
+                if line.strip():
+                    records.append(json.loads(line))
+    except FileNotFoundError:
+        pass
+    return records, offset
+
+
+def changed_indicators(records):
+    """
+    变化的指标，有增删年份的地区包括 年份
+    :return: {地区: 指标集合}，全国数据的地区为 None
+    """
+    changed = {}
+    for record in records:
+        fields = record['fields']
+        indicator = fields.index('indicator')
+        region = fields.index('region') if 'region' in fields else None
+        for cell in record['cells']:
+            changed.setdefault(None if region is None else cell[region], set()).add(cell[indicator])
+        for row in record['rows']['added'] + record['rows']['removed']:
+            changed.setdefault(row[0] if isinstance(row, list) else None, set()).add('年份')
+    return changed
+
+
+def version_chain(records, dataset, previous, version):
+    """
+    从 previous 版本到 version 版本之间的变化记录，中间有不是爬虫保存的版本（没有记录）时返回 None
+    """
+    if previous == version:
+        return []
+    chain = []
+    current = previous
+    for record in records:
+        if record['dataset'] == os.path.basename(dataset) and record['previous'] == current:
+            chain.append(record)
+            current = record['version']
+            if current == version:
+                return chain
+    return chain if current == version else None
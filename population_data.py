@@ -0,0 +1,338 @@
+"""
+人口数据读取
+第一次使用时才读取 population.xlsx，并在同目录下保存解析后的列缓存，
+excel 文件没有变化时直接读取缓存，不再解析 excel
+缓存为固定格式的二进制文件，通过 numpy.memmap 直接映射，不复制数据，多个进程共用同一份内存页
+分地区数据保存在 population_region.parquet 中（长表），按地区取出时转换为和全国数据相同的宽表
+读取的数据都经过 population_schema 检查并转换类型：年份为 int16，没有数据的值为空值
+
+获取详细教程、获取代码帮助、提出意见建议
+关注微信公众号「裸睡的猪」与猪哥联系
+
+@Author  :   猪哥
+
+"""
+import hashlib
+import json
+import os
+import struct
+from itertools import groupby
+
+import numpy as np
+import pandas as pd
+
+from population_files import atomic_open
+from population_schema import conform_dataset, validate_region_store
+
+# 人口数量excel文件保存路径
+POPULATION_EXCEL_PATH = 'population.xlsx'
+# 分地区人口数据保存路径，长表格式：地区、年份、指标、数值
+REGION_STORE_PATH = 'population_region.parquet'
+# 缓存格式版本，缓存结构变化时修改
+CACHE_VERSION = 3
+# 二进制文件格式：8 字节标识 + 4 字节头长度（小端） + json 头 + 列数组
+# 相邻的同类型列保存为一个连续的块，块内每列的数据连续存放，块的起始位置按 BINARY_ALIGN 字节对齐
+BINARY_MAGIC = b'POPDATA\x00'
+BINARY_ALIGN = 64
+
+# 已读取的数据，key 为 excel 文件路径
+_DATASETS = {}
+# 已读取的分地区长表，key 为 parquet 文件路径
+_REGION_STORES = {}
+# 长表转换后的宽表，行索引为 (地区, 年份)，key 为 parquet 文件路径
+_REGION_TABLES = {}
+# 已取出的地区数据，key 为 (parquet 文件路径, 地区)
+_REGION_DATASETS = {}
+
+
+def cache_path(excel_path=POPULATION_EXCEL_PATH):
+    """
+    缓存文件路径，与 excel 文件放在同一目录
+    """
+    root, _ = os.path.splitext(excel_path)
+    return root + '.cache.bin'
+
+
+def file_sha1(path):
+    """
+    计算文件的 sha1
+    """
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def file_version(path=POPULATION_EXCEL_PATH):
+    """
+    数据文件的版本，由修改时间和大小组成，文件更新后版本变化
+    """
+    stat = os.stat(path)
+    return '%d-%d' % (stat.st_mtime_ns, stat.st_size)
+
+
+def get_dataset(excel_path=POPULATION_EXCEL_PATH):
+    """
+    获取人口数据，同一进程内只读取一次
+    """
+    df = _DATASETS.get(excel_path)
+    if df is None:
+        df = _DATASETS[excel_path] = load_dataset(excel_path)
+    return df
+
+
+def set_dataset(df, excel_path=POPULATION_EXCEL_PATH):
+    """
+    设置已读取的数据，子进程直接使用主进程读取好的数据，不再重复读取
+    """
+    _DATASETS[excel_path] = df
+
+
+def get_region_store(path=REGION_STORE_PATH):
+    """
+    获取分地区长表，同一进程内只读取一次
+    需要安装 pyarrow：pip install pyarrow
+    """
+    store = _REGION_STORES.get(path)
+    if store is None:
+        store = _REGION_STORES[path] = load_region_store(path)
+    return store
+
+
+def load_region_store(path=REGION_STORE_PATH):
+    """
+    读取分地区长表
+    """
+    store = pd.read_parquet(path)
+    validate_region_store(store, path)
+    return store
+
+
+def set_region_store(store, path=REGION_STORE_PATH):
+    """
+    设置已读取的分地区长表，子进程直接使用主进程读取好的数据
+    """
+    _REGION_STORES[path] = store
+    _REGION_TABLES.pop(path, None)
+    for key in [key for key in _REGION_DATASETS if key[0] == path]:
+        del _REGION_DATASETS[key]
+
+
+def region_names(path=REGION_STORE_PATH):
+    """
+    分地区数据中的所有地区
+    """
+    return sorted(get_region_store(path)['region'].unique())
+
+
+def get_region_dataset(region, path=REGION_STORE_PATH):
+    """
+    某个地区的数据，格式与全国数据相同：每行一个年份，没有数据的值为空值
+    所有地区一次转换为宽表，之后按地区直接取出，同一进程内每个地区只取一次
+    """
+    df = _REGION_DATASETS.get((path, region))
+    if df is not None:
+        return df
+    table = _REGION_TABLES.get(path)
+    if table is None:
+        store = get_region_store(path)
+        table = store.set_index(['region', 'year', 'indicator'])['value'].unstack('indicator')
+        table.columns = table.columns.astype(str)
+        table.columns.name = None
+        table = _REGION_TABLES[path] = table.sort_index()
+    try:
+        df = table.xs(region, level='region')
+    except KeyError:
+        raise KeyError('没有地区 %s 的数据' % region) from None
+    df = df.loc[:, df.notna().any()].rename_axis('年份').reset_index()
+    df = conform_dataset(df, '%s的数据' % region, required=['年份'])
+    _REGION_DATASETS[(path, region)] = df
+    return df
+
+
+def year_position(df, year):
+    """
+    年份所在的行号，数据按年份排序
+    年份连续时直接用 年份-第一年 计算，否则二分查找
+    """
+    years = df['年份'].values
+    position = int(year - years[0]) if len(years) else -1
+    if not 0 <= position < len(years) or years[position] != year:
+        position = int(np.searchsorted(years, year))
+        if position >= len(years) or years[position] != year:
+            raise KeyError('没有 %s 年的数据' % year)
+    return position
+
+
+def year_positions(years, named_years):
+    """
+    多个年份所在的行号，years 为按年份排序的年份列，一次二分查找全部算出
+    :param named_years: {名称: 年份}
+    :return: {名称: 行号}，没有数据的年份不在结果中
+    """
+    years = np.asarray(years)
+    wanted = np.fromiter(named_years.values(), dtype=np.int64, count=len(named_years))
+    positions = np.searchsorted(years, wanted)
+    found = positions < len(years)
+    found[found] = years[positions[found]] == wanted[found]
+    return {name: int(position) for name, position, ok in zip(named_years, positions, found) if ok}
+
+
+def complete_years(df, columns):
+    """
+    columns 都有数据的年份，按年份排序
+    """
+    complete = np.ones(len(df), dtype=bool)
+    for column in columns:
+        complete &= df[column].notna().values
+    return df['年份'].values[complete]
+
+
+def at_year(df, year, columns):
+    """
+    取某一年的数据，columns 为列名时返回数值，为列名列表时返回数组
+    """
+    position = year_position(df, year)
+    if isinstance(columns, str):
+        return df[columns].values[position]
+    return np.array([df[column].values[position] for column in columns])
+
+
+def is_mapped(df):
+    """
+    数据是否映射自二进制文件，映射的数据子进程自己打开即可，不需要传递
+    """
+    for column in df.columns:
+        base = df[column].values
+        while isinstance(base, np.ndarray):
+            if isinstance(base, np.memmap):
+                return True
+            base = base.base
+    return False
+
+
+def _binary_dtype(values):
+    """
+    列在二进制文件中的类型：整数列为能容纳所有值的 int16 或 int32，float32 列保持 float32，其它数值列为 float64
+    """
+    if np.issubdtype(values.dtype, np.integer):
+        for dtype in ('<i2', '<i4'):
+            info = np.iinfo(dtype)
+            if not len(values) or (info.min <= values.min() and values.max() <= info.max):
+                return dtype
+    elif values.dtype == np.float32:
+        return '<f4'
+    elif not np.issubdtype(values.dtype, np.number) and not np.issubdtype(values.dtype, np.bool_):
+        raise ValueError('列 %s 不是数值类型：%s' % (values.name, values.dtype))
+    return '<f8'
+
+
+def _align(position):
+    return -(-position // BINARY_ALIGN) * BINARY_ALIGN
+
+
+def export_binary(df, path, meta=None):
+    """
+    数据保存为二进制文件，先写临时文件再替换
+    :param meta: 保存在文件头中的其它信息，例如缓存对应的 excel 文件信息
+    """
+    columns = list(df.columns)
+    blocks = []
+    offset = 0
+    for dtype, block_columns in groupby(columns, key=lambda column: _binary_dtype(df[column])):
+        block_columns = list(block_columns)
+        blocks.append({'dtype': dtype, 'columns': block_columns, 'offset': offset})
+        offset = _align(offset + np.dtype(dtype).itemsize * len(block_columns) * len(df))
+    header = json.dumps({'version': CACHE_VERSION, 'rows': len(df), 'columns': columns, 'blocks': blocks,
+                         'meta': meta or {}}, ensure_ascii=False).encode('utf-8')
+
+    with atomic_open(path, 'wb') as f:
+        f.write(BINARY_MAGIC)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        data_start = _align(f.tell())
+        for block in blocks:
+            # 块的形状为 (列数, 行数)，每列的数据连续
+            array = np.ascontiguousarray(df[block['columns']].to_numpy(dtype=block['dtype']).T)
+            f.write(b'\0' * (data_start + block['offset'] - f.tell()))
+            f.write(array.tobytes())
+
+
+def read_binary_header(path):
+    """
+    读取二进制文件头
+    :return: (文件头, 数据起始位置)，文件不存在、损坏或者版本不同时返回 (None, 0)
+    """
+    try:
+        with open(path, 'rb') as f:
+            if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+                return None, 0
+            length, = struct.unpack('<I', f.read(4))
+            header = json.loads(f.read(length).decode('utf-8'))
+            data_start = _align(f.tell())
+    except (OSError, ValueError, struct.error):
+        return None, 0
+    if not isinstance(header, dict) or header.get('version') != CACHE_VERSION:
+        return None, 0
+    return header, data_start
+
+
+def read_binary(path):
+    """
+    通过 numpy.memmap 打开二进制文件，DataFrame 的每一列都直接引用映射的内存，数据只读
+    """
+    header, data_start = read_binary_header(path)
+    if header is None:
+        raise ValueError('%s 不是有效的人口数据文件' % path)
+    mapped = np.memmap(path, dtype=np.uint8, mode='r')
+    rows = header['rows']
+    frames = []
+    for block in header['blocks']:
+        array = np.ndarray((len(block['columns']), rows), dtype=block['dtype'], buffer=mapped,
+                           offset=data_start + block['offset'])
+        frames.append(pd.DataFrame(array.T, columns=block['columns'], copy=False))
+    if not frames:
+        return pd.DataFrame(index=pd.RangeIndex(rows))
+    # 各个块按列的顺序保存，拼接后列的顺序不变，copy=False 不复制数据
+    return frames[0] if len(frames) == 1 else pd.concat(frames, axis=1, copy=False)
+
+
+def load_dataset(excel_path=POPULATION_EXCEL_PATH):
+    """
+    读取人口数据，优先使用缓存，excel 变化后重建缓存
+    """
+    stat = os.stat(excel_path)
+    path = cache_path(excel_path)
+    header, _ = read_binary_header(path)
+    if header is not None:
+        meta = header['meta']
+        # mtime 和大小都没变，认为文件没变
+        if meta.get('mtime') == stat.st_mtime_ns and meta.get('size') == stat.st_size:
+            return read_binary(path)
+        # mtime 变了但内容没变（比如重新拷贝），只更新 mtime
+        sha1 = file_sha1(excel_path)
+        if meta.get('sha1') == sha1:
+            df = read_binary(path)
+            _write_cache(path, df, dict(meta, mtime=stat.st_mtime_ns, size=stat.st_size))
+            return df
+    else:
+        sha1 = file_sha1(excel_path)
+
+    df = conform_dataset(pd.read_excel(excel_path), excel_path)
+    if _write_cache(path, df, {'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'sha1': sha1}):
+        # 使用映射的数据，和之后从缓存读取时的类型一致
+        return read_binary(path)
+    return df
+
+
+def _write_cache(path, df, meta):
+    """
+    写入缓存，返回是否写入成功
+    """
+    try:
+        export_binary(df, path, meta)
+    except OSError:
+        # 目录不可写时只是没有缓存，不影响读取
+        return False
+    return True
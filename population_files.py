@@ -0,0 +1,52 @@
+"""
+文件写入
+所有输出文件（excel、分地区数据、缓存、页面、构建记录、接口响应、监控指标）都先写临时文件再替换，
+读取的一方不会读到写了一半的文件；写入失败时删除临时文件，原来的文件保持不变
+临时文件名带上进程和线程 id，多个进程、线程同时写同一个文件时互不影响
+
+获取详细教程、获取代码帮助、提出意见建议
+关注微信公众号「裸睡的猪」与猪哥联系
+
+@Author  :   猪哥
+
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_path(path, keep_extension=False):
+    """
+    返回临时文件路径，with 块正常结束后替换为 path，出错时删除临时文件
+    :param keep_extension: 临时文件保留 path 的扩展名，例如 pandas 按扩展名选择 excel 的写入方式
+    """
+    root, extension = os.path.splitext(path) if keep_extension else (path, '')
+    tmp_path = '%s.%d.%d.tmp%s' % (root, os.getpid(), threading.get_ident(), extension)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+@contextmanager
+def atomic_open(path, mode='w'):
+    """
+    打开临时文件写入，with 块正常结束后替换为 path；文本模式使用 utf-8
+    """
+    with atomic_path(path) as tmp_path:
+        with open(tmp_path, mode, encoding=None if 'b' in mode else 'utf-8') as f:
+            yield f
+
+
+def write_atomic(path, content):
+    """
+    写入整个文件
+    :param content: str、bytes，或者逐块返回 str/bytes 的迭代器，str 按 utf-8 编码
+    """
+    with atomic_open(path, 'wb') as f:
+        for chunk in ([content] if isinstance(content, (str, bytes)) else content):
+            f.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
@@ -0,0 +1,124 @@
+"""
+派生指标
+比例、差值、同比、滑动平均、复合增长率等指标在这里统一声明，每个指标是基础数据列上的一个运算：
+(运算, 参数...)，列参数可以是列名，也可以是列名列表（多列相加）
+同一个数据集的所有指标一次算出并缓存，各个图表直接取用，不再各自重复计算
+数据集读取后不再修改，数据更新重新读取后是新的对象，所以按数据集对象缓存即相当于按数据版本缓存
+
+获取详细教程、获取代码帮助、提出意见建议
+关注微信公众号「裸睡的猪」与猪哥联系
+
+@Author  :   猪哥
+
+"""
+import weakref
+
+from population_data import year_positions
+from population_transform import (as_array, cagr, change, column_sum, difference, growth_rate, percent,
+                                  rolling_mean, to_yi)
+
+# 序列指标，每年一个值，与数据的行对应：{指标名: (运算, 参数...)}
+SERIES = {
+    # 单位换算
+    '年末总人口(亿人)': ('yi', '年末总人口(万人)'),
+    '城镇人口(亿人)': ('yi', '城镇人口(万人)'),
+    '乡村人口(亿人)': ('yi', '乡村人口(万人)'),
+    # 比例
+    '男性人口占比(%)': ('percent', '男性人口(万人)', '年末总人口(万人)'),
+    '城镇化率(%)': ('percent', '城镇人口(万人)', '年末总人口(万人)'),
+    '推算少儿抚养比(%)': ('percent', '0-14岁人口(万人)', '15-64岁人口(万人)'),
+    '推算老年抚养比(%)': ('percent', '65岁及以上人口(万人)', '15-64岁人口(万人)'),
+    '推算总抚养比(%)': ('percent', ['0-14岁人口(万人)', '65岁及以上人口(万人)'], '15-64岁人口(万人)'),
+    # 差值
+    '男女人口差(万人)': ('difference', '男性人口(万人)', '女性人口(万人)'),
+    # 同比
+    '年末总人口同比增量(万人)': ('change', '年末总人口(万人)', 1),
+    '年末总人口同比增长率(%)': ('growth_rate', '年末总人口(万人)', 1),
+    '城镇人口同比增长率(%)': ('growth_rate', '城镇人口(万人)', 1),
+    # 滑动平均
+    '人口出生率5年均值(‰)': ('rolling_mean', '人口出生率(‰)', 5),
+    '人口死亡率5年均值(‰)': ('rolling_mean', '人口死亡率(‰)', 5),
+    # 复合增长率
+    '年末总人口10年复合增长率(%)': ('cagr', '年末总人口(万人)', 10),
+    '城镇人口10年复合增长率(%)': ('cagr', '城镇人口(万人)', 10),
+}
+
+# 时期指标，两个年份之间的一个值：{指标名: (运算, 列名, 开始年份, 结束年份)}
+PERIODS = {
+    '1949-1979年总人口增量(亿人)': ('increase_yi', '年末总人口(万人)', 1949, 1979),
+    '1979-2010年总人口增量(亿人)': ('increase_yi', '年末总人口(万人)', 1979, 2010),
+}
+
+# 序列运算：参数为 (年份数组, 取列函数, 指标参数...)
+_SERIES_OPS = {
+    'yi': lambda years, get, column: to_yi(get(column)),
+    'percent': lambda years, get, part, whole: percent(get(part), get(whole)),
+    'difference': lambda years, get, minuend, subtrahend: difference(get(minuend), get(subtrahend)),
+    'change': lambda years, get, column, window: change(get(column), years, window),
+    'growth_rate': lambda years, get, column, window: growth_rate(get(column), years, window),
+    'rolling_mean': lambda years, get, column, window: rolling_mean(get(column), window),
+    'cagr': lambda years, get, column, window: cagr(get(column), years, window),
+}
+# 时期运算：参数为 (开始年份的值, 结束年份的值)
+_PERIOD_OPS = {
+    'increase': lambda start, end: end - start,
+    'increase_yi': lambda start, end: to_yi(end - start),
+}
+
+# 已计算的指标，id(数据集) -> (数据集的弱引用, 指标)
+_CACHE = {}
+
+
+def _columns(args):
+    """
+    指标参数中的列名
+    """
+    for arg in args:
+        if isinstance(arg, str):
+            yield arg
+        elif isinstance(arg, (list, tuple)):
+            yield from arg
+
+
+def compute_indicators(df, series=SERIES, periods=PERIODS):
+    """
+    计算所有派生指标，每个基础列只转换一次数组
+    :return: {指标名: 数组或数值}，缺少基础列或者年份的指标不在结果中
+    """
+    arrays = {}
+
+    def get(columns):
+        key = tuple(columns) if isinstance(columns, list) else columns
+        if key not in arrays:
+            arrays[key] = column_sum([get(column) for column in columns]) if isinstance(columns, list) \
+                else as_array(df[columns])
+        return arrays[key]
+
+    years = df['年份'].values
+    result = {}
+    for name, (op, *args) in series.items():
+        if all(column in df.columns for column in _columns(args)):
+            result[name] = _SERIES_OPS[op](years, get, *args)
+
+    # 时期指标需要的年份一次查找
+    wanted = {year for _, _, start, end in periods.values() for year in (start, end)}
+    positions = year_positions(years, {year: year for year in wanted})
+    for name, (op, column, start, end) in periods.items():
+        if column in df.columns and start in positions and end in positions:
+            values = get(column)
+            result[name] = _PERIOD_OPS[op](values[positions[start]], values[positions[end]])
+    return result
+
+
+def derived_indicators(df):
+    """
+    数据集的所有派生指标，同一个数据集只计算一次
+    """
+    key = id(df)
+    entry = _CACHE.get(key)
+    if entry is not None and entry[0]() is df:
+        return entry[1]
+    result = compute_indicators(df)
+    # 数据集被回收后删除缓存
+    _CACHE[key] = (weakref.ref(df, lambda _: _CACHE.pop(key, None)), result)
+    return result
@@ -0,0 +1,177 @@
+"""
+人口预测
+从最近一年的数据出发，按 0-14岁、15-64岁、65岁及以上 三个年龄段逐年推算：
+出生人口进入 0-14 岁，每年有一部分人进入下一个年龄段，死亡人口按各年龄段的死亡率倍数分摊
+出生率、死亡率按最近几年的变化趋势随机变化（蒙特卡洛），每批情景用 numpy 数组一起计算，
+多批情景可以用进程池并行计算
+
+python population_projection.py --years 30 --scenarios 10000 --jobs 4
+
+获取详细教程、获取代码帮助、提出意见建议
+关注微信公众号「裸睡的猪」与猪哥联系
+
+@Author  :   猪哥
+
+"""
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from population_data import get_dataset
+
+# 预测年数
+PROJECTION_YEARS = 30
+# 情景数
+SCENARIOS = 10000
+# 每批计算的情景数
+BATCH_SIZE = 2500
+# 随机数种子，相同的种子结果相同，与批次大小以外的参数（例如进程数）无关
+SEED = 2019
+# 估计出生率、死亡率变化趋势使用的最近年数
+HISTORY_YEARS = 20
+# 年龄段的列
+AGE_COLUMNS = ['0-14岁人口(万人)', '15-64岁人口(万人)', '65岁及以上人口(万人)']
+# 出生率、死亡率、自然增长率的列
+RATE_COLUMNS = ['人口出生率(‰)', '人口死亡率(‰)', '人口自然增长率(‰)']
+# 每年从 0-14 岁进入 15-64 岁、从 15-64 岁进入 65 岁及以上的比例，近似为年龄段跨度的倒数
+AGING_RATES = (1 / 15, 1 / 50)
+# 各年龄段死亡率相对的倍数，死亡人口总数由死亡率决定，按 倍数 x 人口 分摊到各年龄段
+DEATH_WEIGHTS = (0.2, 0.4, 4.5)
+# 统计的分位数
+QUANTILES = (5, 50, 95)
+
+
+def projection_inputs(df, history_years=HISTORY_YEARS):
+    """
+    预测的起点和出生率、死亡率的变化趋势
+    起点为年龄段和出生率都有数据的最后一年；死亡率没有数据时用 出生率 - 自然增长率 计算
+    """
+    available = df[AGE_COLUMNS + RATE_COLUMNS[:1]].notna().values.all(axis=1)
+    if not available.any():
+        raise ValueError('没有年龄结构和出生率都有数据的年份，无法预测')
+    last = np.flatnonzero(available)[-1]
+    birth, death, growth = (df[column].values.astype(np.float64) for column in RATE_COLUMNS)
+    death = np.where(np.isnan(death), birth - growth, death)
+
+    def trend(rates):
+        # 对数变化率的均值和标准差
+        recent = rates[max(last - history_years, 0):last + 1]
+        steps = np.diff(np.log(recent[recent > 0]))
+        if len(steps) < 2:
+            return 0.0, 0.0, len(steps)
+        return float(steps.mean()), float(steps.std(ddof=1)), len(steps)
+
+    return {
+        'year': int(df['年份'].values[last]),
+        'population': df[AGE_COLUMNS].values[last].astype(np.float64),
+        'birth': float(birth[last]),
+        'death': float(death[last]),
+        'birth_trend': trend(birth),
+        'death_trend': trend(death),
+    }
+
+
+def rate_paths(rate, trend, scenarios, years, rng):
+    """
+    每个情景未来每年的比率，shape 为 (情景数, 年数)
+    每个情景的趋势在历史趋势附近随机取值，每年再加上随机波动
+    """
+    drift, sigma, samples = trend
+    drifts = rng.normal(drift, sigma / np.sqrt(max(samples, 1)), size=(scenarios, 1))
+    shocks = rng.normal(0.0, sigma, size=(scenarios, years))
+    return rate * np.exp(np.cumsum(drifts + shocks, axis=1))
+
+
+def simulate(inputs, scenarios, years, seed):
+    """
+    计算一批情景
+    :return: 各年龄段人口，shape 为 (情景数, 3, 年数 + 1)，第 0 年为起点
+    """
+    rng = np.random.default_rng(seed)
+    births = rate_paths(inputs['birth'], inputs['birth_trend'], scenarios, years, rng) / 1000
+    deaths = rate_paths(inputs['death'], inputs['death_trend'], scenarios, years, rng) / 1000
+    aging = np.array(AGING_RATES)
+    weights = np.array(DEATH_WEIGHTS)
+
+    result = np.empty((scenarios, 3, years + 1))
+    result[:, :, 0] = inputs['population']
+    for t in range(years):
+        population = result[:, :, t]
+        total = population.sum(axis=1)
+        # 死亡人口按 倍数 x 人口 分摊，各年龄段的死亡比例 = 倍数 x 总死亡人口 / sum(倍数 x 人口)
+        death_share = deaths[:, t] * total / (population @ weights)
+        survivors = population * (1 - death_share[:, None] * weights)
+        moving = survivors[:, :2] * aging
+        result[:, 0, t + 1] = survivors[:, 0] - moving[:, 0] + births[:, t] * total
+        result[:, 1, t + 1] = survivors[:, 1] + moving[:, 0] - moving[:, 1]
+        result[:, 2, t + 1] = survivors[:, 2] + moving[:, 1]
+    return result
+
+
+def _simulate_batch(args):
+    return simulate(*args)
+
+
+def project(inputs, years=PROJECTION_YEARS, scenarios=SCENARIOS, batch_size=BATCH_SIZE, jobs=1, seed=SEED):
+    """
+    分批计算所有情景
+    :param jobs: 进程数，1 表示在当前进程中计算
+    :return: 各年龄段人口，shape 为 (情景数, 3, 年数 + 1)
+    """
+    sizes = [min(batch_size, scenarios - start) for start in range(0, scenarios, batch_size)]
+    # 每批使用独立的随机数，结果与进程数无关
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(inputs, size, years, batch_seed) for size, batch_seed in zip(sizes, seeds)]
+    if jobs <= 1 or len(tasks) <= 1:
+        batches = [_simulate_batch(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as executor:
+            batches = list(executor.map(_simulate_batch, tasks))
+    return np.concatenate(batches) if batches else np.empty((0, 3, years + 1))
+
+
+def summarize(bands, quantiles=QUANTILES):
+    """
+    各年的分位数
+    :return: {'total': 总人口, 'age_14'/'age_15_64'/'age_65': 各年龄段人口,
+              'dependency': 总抚养比(%), 'old_dependency': 老年抚养比(%)}，每项 shape 为 (分位数个数, 年数 + 1)
+    """
+    total = bands.sum(axis=1)
+    series = {
+        'total': total,
+        'age_14': bands[:, 0],
+        'age_15_64': bands[:, 1],
+        'age_65': bands[:, 2],
+        'dependency': (bands[:, 0] + bands[:, 2]) / bands[:, 1] * 100,
+        'old_dependency': bands[:, 2] / bands[:, 1] * 100,
+    }
+    return {name: np.percentile(values, quantiles, axis=0) for name, values in series.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='人口预测')
+    parser.add_argument('--years', type=int, default=PROJECTION_YEARS, help='预测年数')
+    parser.add_argument('--scenarios', type=int, default=SCENARIOS, help='情景数')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='每批计算的情景数')
+    parser.add_argument('--jobs', '-j', type=int, default=1, help='进程数')
+    parser.add_argument('--seed', type=int, default=SEED, help='随机数种子')
+    args = parser.parse_args(argv)
+
+    inputs = projection_inputs(get_dataset())
+    start = time.perf_counter()
+    bands = project(inputs, args.years, args.scenarios, args.batch_size, args.jobs, args.seed)
+    elapsed = time.perf_counter() - start
+    summary = summarize(bands)
+    print('%d 个情景 x %d 年，耗时 %.3fs' % (args.scenarios, args.years, elapsed))
+    print('%-6s %12s %12s %12s %10s' % ('年份', '总人口P5', '总人口P50', '总人口P95', '老年抚养比'))
+    for t in range(0, args.years + 1, 5):
+        low, median, high = summary['total'][:, t]
+        print('%-6d %12.0f %12.0f %12.0f %9.2f%%' % (inputs['year'] + t, low, median, high,
+                                                     summary['old_dependency'][1, t]))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
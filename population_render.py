@@ -0,0 +1,159 @@
+"""
+html 渲染
+pyecharts 的 Page.render 会先把整个 html 拼成一个字符串再写入文件，图表越多占用内存越大，并且每次都重新生成公共样式的 json
+write_page 逐个图表生成配置 json 并直接写入文件（或者 http 响应），同一时间只保存一个图表的 json，公共样式使用缓存的 json
+js 文件可以使用本地的同一份，不需要每个页面都从网上下载
+
+获取详细教程、获取代码帮助、提出意见建议
+关注微信公众号「裸睡的猪」与猪哥联系
+
+@Author  :   猪哥
+
+"""
+import hashlib
+import html
+import os
+
+import requests
+from pyecharts.charts.composite_charts.page import DOWNLOAD_CFG_FUNC, _MARK_FREEDOM_LAYOUT
+from pyecharts.datasets import FILENAMES
+from pyecharts.globals import CurrentConfig
+
+from population_files import atomic_open, write_atomic
+from population_theme import dump_options
+
+# 可拖拽布局需要的 js
+DRAGGABLE_DEPENDENCIES = ['jquery', 'jquery-ui', 'resize-sensor']
+# 可拖拽布局需要的 css
+DRAGGABLE_CSS = ['jquery-ui.css']
+
+
+def asset_file(name):
+    """
+    js 依赖对应的文件名，例如 echarts -> echarts.min.js
+    """
+    filename, extension = FILENAMES[name]
+    return '%s.%s' % (filename, extension)
+
+
+def is_local_host(js_host):
+    """
+    js_host 是否为本地目录
+    """
+    return not js_host.startswith(('http://', 'https://', '//'))
+
+
+def ensure_assets(directory, names, css_names=(), online_host=CurrentConfig.ONLINE_HOST):
+    """
+    把 js、css 文件下载到本地目录，已经存在的文件不再下载，所有页面共用这一份
+    """
+    os.makedirs(directory, exist_ok=True)
+    for filename in [asset_file(name) for name in names] + list(css_names):
+        path = os.path.join(directory, filename)
+        if os.path.exists(path):
+            continue
+        response = requests.get(online_host + filename, timeout=30)
+        response.raise_for_status()
+        write_atomic(path, response.content)
+
+
+def page_dependencies(page):
+    """
+    页面需要的 js 依赖和 css 文件
+    """
+    names = list(page.js_dependencies.items)
+    css_names = []
+    if page.layout == _MARK_FREEDOM_LAYOUT:
+        names += [name for name in DRAGGABLE_DEPENDENCIES if name not in names]
+        css_names = DRAGGABLE_CSS
+    return [name for name in names if name in FILENAMES], css_names
+
+
+def set_chart_ids(page, key):
+    """
+    按 key（例如报告名）和图表序号设置图表 id，pyecharts 默认使用随机 id，同样的数据每次渲染出的 html 都不同
+    """
+    for index, chart in enumerate(page):
+        chart.chart_id = hashlib.sha1(('%s#%d' % (key, index)).encode('utf-8')).hexdigest()[:32]
+
+
+def write_page(page, fp, js_host=None):
+    """
+    把 Page 中的图表逐个写入 fp，页面结构与 Page.render 生成的相同
+    :param fp: 文本文件对象，只需要有 write 方法
+    :param js_host: js 文件的地址前缀，可以是本地目录，默认使用 page.js_host
+    """
+    js_host = js_host or page.js_host
+    draggable = page.layout == _MARK_FREEDOM_LAYOUT
+    names, css_names = page_dependencies(page)
+
+    fp.write('<!DOCTYPE html>\n<html>\n<head>\n    <meta charset="UTF-8">\n')
+    fp.write('    <title>%s</title>\n' % html.escape(page.page_title))
+    for name in names:
+        fp.write('    <script type="text/javascript" src="%s%s"></script>\n' % (js_host, asset_file(name)))
+    for css_name in css_names:
+        fp.write('    <link rel="stylesheet"  href="%s%s">\n' % (js_host, css_name))
+    fp.write('</head>\n<body>\n')
+    fp.write('    <style>.box { %s }; </style>\n' % ('' if draggable else page.layout))
+    if draggable:
+        fp.write('    <button onclick="downloadCfg()">Save Config</button>\n')
+    fp.write('    <div class="box">\n')
+
+    chart_ids = []
+    for chart in page:
+        chart_id = chart.chart_id
+        chart_ids.append(chart_id)
+        fp.write('        <div id="%s" class="chart-container" style="width:%s; height:%s;"></div>\n'
+                 % (chart_id, chart.width, chart.height))
+        fp.write('        <script>\n')
+        fp.write("            var chart_%s = echarts.init(\n                document.getElementById('%s'), '%s', "
+                 "{renderer: '%s'});\n" % (chart_id, chart_id, chart.theme, chart.renderer))
+        for js in chart.js_functions.items:
+            fp.write('            %s\n' % js)
+        # 每次只生成一个图表的配置
+        fp.write('            var option_%s = ' % chart_id)
+        fp.write(dump_options(chart))
+        fp.write(';\n            chart_%s.setOption(option_%s);\n' % (chart_id, chart_id))
+        fp.write('        </script>\n')
+        fp.write('        <br/>\n' * page.page_interval)
+    fp.write('    </div>\n    <script>\n')
+
+    for js in page.js_functions.items:
+        fp.write('        %s\n' % js)
+    if draggable:
+        for chart_id in chart_ids:
+            # 图表可拖拽、可改变大小
+            fp.write("        $('#%s').resizable().draggable().css('border-style', 'dashed')"
+                     ".css('border-width', '1px');" % chart_id)
+            fp.write('$("#%s>div:nth-child(1)").width("100%%").height("100%%");' % chart_id)
+            fp.write("new ResizeSensor(jQuery('#%s'), function() { chart_%s.resize()});\n" % (chart_id, chart_id))
+        fp.write('        var charts_id = [%s];%s\n' % (','.join("'%s'" % chart_id for chart_id in chart_ids),
+                                                       DOWNLOAD_CFG_FUNC))
+    fp.write('    </script>\n</body>\n</html>\n')
+
+
+def relative_js_host(directory, path):
+    """
+    页面 path 引用本地 js 目录 directory 的相对地址，例如 regions/北京市/ 下的页面引用 assets/ 时为 ../../assets/
+    """
+    relative = os.path.relpath(directory, os.path.dirname(os.path.abspath(path)))
+    return relative.replace(os.sep, '/') + '/'
+
+
+def render_page(page, path, js_host=None):
+    """
+    用 write_page 渲染页面到 path
+    :param js_host: js 文件的地址前缀；本地目录（例如 assets/）相对于当前目录（项目根目录），
+                    所有页面共用这一个目录，需要的文件先下载到该目录，页面中使用相对地址引用
+    """
+    if js_host:
+        if is_local_host(js_host):
+            names, css_names = page_dependencies(page)
+            directory = os.path.abspath(js_host)
+            ensure_assets(directory, names, css_names)
+            js_host = relative_js_host(directory, path)
+        page.js_host = js_host
+
+    # 先写临时文件再替换，读取的一方不会读到写了一半的文件
+    with atomic_open(path) as f:
+        write_page(page, f)
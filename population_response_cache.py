@@ -0,0 +1,130 @@
+"""
+接口响应缓存
+同样的查询条件不再重复请求国家统计局接口，响应保存在本地目录中：
+- online：缓存未过期时直接使用，过期后带上 ETag/Last-Modified 重新确认，304 时继续使用缓存
+- refresh：忽略缓存，全部重新请求并保存
+- offline：只使用缓存，不访问网络，没有缓存时报错；可以把录制好的缓存目录作为测试数据
+缓存的 key 为规范化后的查询参数（wds、dfwds 按维度排序），与参数顺序和接口地址无关
+
+获取详细教程、获取代码帮助、提出意见建议
+关注微信公众号「裸睡的猪」与猪哥联系
+
+@Author  :   猪哥
+
+"""
+import hashlib
+import json
+import os
+import time
+
+from population_files import write_atomic
+
+# 缓存目录
+RESPONSE_CACHE_DIR = '.population_responses'
+# 缓存有效期（秒）
+RESPONSE_TTL = 24 * 3600
+# 缓存模式
+CACHE_MODES = ('online', 'refresh', 'offline')
+# 下载响应时每次写入缓存文件的大小
+CHUNK_SIZE = 1 << 16
+
+
+def normalize_query(params):
+    """
+    规范化查询条件：wds、dfwds 按维度代码排序，其它参数按名称排序
+    """
+    query = dict(params)
+    for key in ('wds', 'dfwds'):
+        if key in query:
+            conditions = json.loads(query[key]) if isinstance(query[key], str) else query[key]
+            query[key] = sorted(conditions, key=lambda condition: condition['wdcode'])
+    return query
+
+
+def query_key(query):
+    """
+    查询条件对应的缓存文件名
+    """
+    text = json.dumps(query, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    接口响应缓存，每个查询保存两个文件：key.json 为响应内容，key.meta.json 为查询条件、获取时间、ETag 等信息
+    """
+
+    def __init__(self, directory=RESPONSE_CACHE_DIR, ttl=RESPONSE_TTL, mode='online'):
+        if mode not in CACHE_MODES:
+            raise ValueError('未知的缓存模式：%s，可选：%s' % (mode, ', '.join(CACHE_MODES)))
+        self.directory = directory
+        self.ttl = ttl
+        self.mode = mode
+
+    def paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + '.json', base + '.meta.json'
+
+    def load_meta(self, key):
+        """
+        读取缓存信息，没有缓存或者缓存损坏时返回 None
+        """
+        body_path, meta_path = self.paths(key)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if os.path.exists(body_path) else None
+
+    def store_meta(self, key, meta):
+        """
+        保存缓存信息，先写临时文件再替换
+        """
+        write_atomic(self.paths(key)[1], json.dumps(meta, ensure_ascii=False, indent=2).encode('utf-8'))
+
+    def get(self, session, url, params, timeout=None):
+        """
+        查询接口，返回解析后的 json
+        """
+        with self.open(session, url, params, timeout) as fp:
+            return json.load(fp)
+
+    def open(self, session, url, params, timeout=None):
+        """
+        查询接口，返回缓存文件的二进制文件对象，响应边下载边写入缓存文件，不在内存中保存整个响应
+        """
+        query = normalize_query(params)
+        key = query_key(query)
+        body_path, _ = self.paths(key)
+        meta = None if self.mode == 'refresh' else self.load_meta(key)
+        if self.mode == 'offline':
+            if meta is None:
+                raise KeyError('离线模式下没有缓存的响应：%s' % json.dumps(query, ensure_ascii=False))
+            return open(body_path, 'rb')
+        if meta is not None and time.time() - meta['fetched_at'] < self.ttl:
+            return open(body_path, 'rb')
+
+        # 缓存过期，带上 ETag/Last-Modified 确认内容是否有变化
+        headers = {}
+        if meta is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+        with session.get(url, params=params, headers=headers, timeout=timeout, stream=True) as response:
+            if response.status_code == 304 and meta is not None:
+                meta['fetched_at'] = time.time()
+                self.store_meta(key, meta)
+                return open(body_path, 'rb')
+            response.raise_for_status()
+            os.makedirs(self.directory, exist_ok=True)
+            write_atomic(body_path, response.iter_content(CHUNK_SIZE))
+            self.store_meta(key, {
+                'query': query,
+                'url': url,
+                'fetched_at': time.time(),
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+            })
+        return open(body_path, 'rb')
@@ -0,0 +1,181 @@
+"""
+数据格式
+读取数据时统一检查一次列和取值，并转换为固定的类型：
+- 年份为能容纳的最小整数类型（一般为 int16），按年份排序，不能重复
+- 数值列为 float64，没有数据的值为空值（nan），不再用 0 表示；旧数据中的 0 读取时转换为空值
+爬虫保存数据前同样检查，格式不对的数据不会覆盖已有的文件
+
+数值列没有使用 float32：出生率 10.48 之类的数值 float32 无法精确表示，图表中会显示为 10.479999542236328
+
+获取详细教程、获取代码帮助、提出意见建议
+关注微信公众号「裸睡的猪」与猪哥联系
+
+@Author  :   猪哥
+
+"""
+import numpy as np
+import pandas as pd
+
+# 年份列
+YEAR_COLUMN = '年份'
+# 必须有的列
+REQUIRED_COLUMNS = ['年份', '年末总人口(万人)']
+# 数值列按单位检查取值范围：{单位: (最小值, 最大值)}，None 表示不限
+UNIT_RANGES = {
+    '(万人)': (0, None),
+    '(‰)': (-1000, 1000),
+    '(%)': (0, None),
+}
+# 0 是正常数值的列，其它数值列的 0 都表示没有数据
+ZERO_VALUE_COLUMNS = {'人口自然增长率(‰)'}
+# 年份使用的整数类型，从小到大选择能容纳所有年份的类型
+YEAR_DTYPES = (np.int16, np.int32, np.int64)
+# 分地区长表的列
+REGION_STORE_COLUMNS = ['region', 'year', 'indicator', 'value']
+
+
+def column_range(column):
+    """
+    数值列的取值范围，按列名中的单位查找，没有限制时返回 (None, None)
+    """
+    for unit, value_range in UNIT_RANGES.items():
+        if column.endswith(unit):
+            return value_range
+    return None, None
+
+
+def numeric_values(series):
+    """
+    转换为 float64 数组，不是数值的列返回 None
+    """
+    if not pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+        if series.dtype != object:
+            return None
+        # object 类型的列（例如从 json 中读取）只要都是数值也可以
+        values = pd.to_numeric(series, errors='coerce')
+        if values.isna().sum() != series.isna().sum():
+            return None
+        series = values
+    return np.asarray(series, dtype=np.float64)
+
+
+def year_errors(years):
+    """
+    年份列的问题：不能为空、必须是整数、不能重复
+    """
+    values = numeric_values(years)
+    if values is None:
+        return ['年份不是数值类型：%s' % years.dtype]
+    if np.isnan(values).any():
+        return ['年份有空值']
+    if (values != np.round(values)).any():
+        return ['年份不是整数']
+    unique, counts = np.unique(values, return_counts=True)
+    if (counts > 1).any():
+        return ['年份重复：%s' % ', '.join('%d' % year for year in unique[counts > 1][:10])]
+    return []
+
+
+def value_errors(column, series):
+    """
+    数值列的问题：必须是数值，不能为无穷大，不能超出单位对应的取值范围
+    """
+    values = numeric_values(series)
+    if values is None:
+        return ['列 %s 不是数值类型：%s' % (column, series.dtype)]
+    errors = []
+    if np.isinf(values).any():
+        errors.append('列 %s 有无穷大的值' % column)
+    low, high = column_range(column)
+    with np.errstate(invalid='ignore'):
+        if low is not None and (values < low).any():
+            errors.append('列 %s 有小于 %s 的值：%s' % (column, low, np.nanmin(values)))
+        if high is not None and (values > high).any():
+            errors.append('列 %s 有大于 %s 的值：%s' % (column, high, np.nanmax(values)))
+    return errors
+
+
+def schema_errors(df, required=REQUIRED_COLUMNS):
+    """
+    检查每年一行的数据，返回问题列表，没有问题时返回空列表
+    """
+    errors = ['缺少列：%s' % column for column in required if column not in df.columns]
+    duplicated = df.columns[df.columns.duplicated()]
+    if len(duplicated):
+        errors.append('列名重复：%s' % ', '.join(map(str, duplicated)))
+    if YEAR_COLUMN in df.columns and not len(duplicated):
+        errors += year_errors(df[YEAR_COLUMN])
+    for column in df.columns:
+        if column != YEAR_COLUMN and not len(duplicated):
+            errors += value_errors(str(column), df[column])
+    return errors
+
+
+def validate_dataset(df, source='数据', required=REQUIRED_COLUMNS):
+    """
+    检查每年一行的数据，有问题时抛出 ValueError
+    :param source: 错误信息中的数据来源，例如文件名
+    """
+    errors = schema_errors(df, required)
+    if errors:
+        raise ValueError('%s格式错误：\n%s' % (source, '\n'.join(errors)))
+
+
+def year_dtype(years):
+    """
+    能容纳所有年份的最小整数类型
+    """
+    for dtype in YEAR_DTYPES:
+        info = np.iinfo(dtype)
+        if not len(years) or (info.min <= years.min() and years.max() <= info.max):
+            return dtype
+    return YEAR_DTYPES[-1]
+
+
+def conform_dataset(df, source='数据', required=REQUIRED_COLUMNS):
+    """
+    检查数据并转换为固定的类型，按年份排序
+    数值列转换为 float64，0 表示没有数据的列中的 0 转换为空值
+    """
+    validate_dataset(df, source, required)
+    years = np.asarray(df[YEAR_COLUMN], dtype=np.int64)
+    order = np.argsort(years, kind='stable')
+    columns = {YEAR_COLUMN: years[order].astype(year_dtype(years))}
+    for column in df.columns:
+        if column == YEAR_COLUMN:
+            continue
+        values = numeric_values(df[column])[order]
+        if column not in ZERO_VALUE_COLUMNS:
+            values[values == 0] = np.nan
+        columns[column] = values
+    return pd.DataFrame(columns)
+
+
+def validate_region_store(store, source='分地区数据'):
+    """
+    检查分地区长表：列齐全、年份为整数、数值不为空且在取值范围内、同一地区同一年份的指标不重复
+    """
+    missing = [column for column in REGION_STORE_COLUMNS if column not in store.columns]
+    if missing:
+        raise ValueError('%s格式错误：\n缺少列：%s' % (source, ', '.join(missing)))
+    errors = []
+    if not pd.api.types.is_integer_dtype(store['year'].dtype):
+        errors.append('年份不是整数类型：%s' % store['year'].dtype)
+    values = numeric_values(store['value'])
+    if values is None:
+        errors.append('数值不是数值类型：%s' % store['value'].dtype)
+    else:
+        if not np.isfinite(values).all():
+            errors.append('数值有空值或者无穷大')
+        # 每个指标按单位检查取值范围
+        indicators = store['indicator'].astype(str).values
+        for indicator in pd.unique(indicators):
+            low, high = column_range(indicator)
+            selected = values[indicators == indicator]
+            with np.errstate(invalid='ignore'):
+                if (low is not None and (selected < low).any()) or (high is not None and (selected > high).any()):
+                    errors.append('指标 %s 的数值超出范围 %s - %s' % (indicator, low, high))
+    if store.duplicated(['region', 'year', 'indicator']).any():
+        errors.append('同一地区同一年份的指标重复')
+    if errors:
+        raise ValueError('%s格式错误：\n%s' % (source, '\n'.join(errors)))
@@ -0,0 +1,271 @@
+"""
+报告服务
+访问 /report/total 等地址时直接返回报告页面，不需要手动运行脚本重新生成 html
+渲染好的页面按数据版本缓存，再次访问只需要查缓存；数据文件更新后版本变化，自动重新渲染
+爬虫记录了数据变化时（见 population_changes），只有用到变化指标的报告重新渲染，其它报告继续使用缓存
+支持 ETag（304）和 gzip
+
+python population_server.py --port 8000
+python population_server.py --js-host assets/    # js 使用本地目录，页面通过 /assets/ 引用
+http://127.0.0.1:8000/report/total
+http://127.0.0.1:8000/report/sex?region=北京市
+
+获取详细教程、获取代码帮助、提出意见建议
+关注微信公众号「裸睡的猪」与猪哥联系
+
+@Author  :   猪哥
+
+"""
+import argparse
+import gzip
+import hashlib
+import html
+import io
+import mimetypes
+import os
+import threading
+from functools import lru_cache
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+
+import requests
+
+from population_analysis import REPORTS, report_available, report_dataset, report_key
+from population_changes import CHANGE_LOG_PATH, changed_indicators, read_changes, version_chain
+from population_data import (POPULATION_EXCEL_PATH, REGION_STORE_PATH, file_sha1, file_version, load_dataset,
+                             load_region_store, set_dataset, set_region_store)
+from population_render import ensure_assets, is_local_host, page_dependencies, set_chart_ids, write_page
+from population_trace import span
+
+# 默认监听地址
+HOST = '127.0.0.1'
+PORT = 8000
+# 最多缓存的页面数，不同报告、地区、数据版本各占一个
+CACHE_SIZE = 64
+# --js-host 为本地目录时，页面通过这个地址引用目录中的 js 文件
+ASSETS_PATH = '/assets/'
+
+# 已读取的数据文件版本，key 为文件路径
+_LOADED_VERSIONS = {}
+# 已读取的数据文件内容的 sha1，key 为文件路径；只有修改时间变化（例如 touch）的文件不重新读取
+_LOADED_HASHES = {}
+_LOAD_LOCK = threading.Lock()
+# 每个报告使用的数据版本，key 为 (报告名, 地区)，数据更新后只删除受影响的报告
+_REPORT_VERSIONS = {}
+# 已读取的变化记录，只保留版本和变化的指标
+_CHANGE_RECORDS = []
+_CHANGE_OFFSET = 0
+
+
+def dataset_version(region=None):
+    """
+    当前的数据版本，数据文件更新后重新读取数据
+    版本由修改时间和大小组成，版本变化时再比较文件的 sha1，内容没有变化时不重新读取，所有报告继续使用缓存
+    """
+    path = POPULATION_EXCEL_PATH if region is None else REGION_STORE_PATH
+    version = file_version(path)
+    with _LOAD_LOCK:
+        previous = _LOADED_VERSIONS.get(path)
+        if previous != version:
+            sha1 = file_sha1(path)
+            if sha1 != _LOADED_HASHES.get(path):
+                if region is None:
+                    set_dataset(load_dataset(path))
+                else:
+                    set_region_store(load_region_store(path))
+                if previous is not None:
+                    expire_reports(path, region is None, previous, version)
+            _LOADED_VERSIONS[path] = version
+            _LOADED_HASHES[path] = sha1
+    return version
+
+
+def expire_reports(path, national, previous, version):
+    """
+    数据文件更新后删除受影响的报告的版本，这些报告下次访问时使用新版本重新渲染
+    变化记录中找不到从 previous 到 version 的记录（例如手动修改了文件）时，该文件的所有报告都重新渲染
+    """
+    global _CHANGE_OFFSET
+    records, _CHANGE_OFFSET = read_changes(CHANGE_LOG_PATH, _CHANGE_OFFSET)
+    _CHANGE_RECORDS.extend({'dataset': record['dataset'], 'previous': record['previous'],
+                            'version': record['version'], 'changed': changed_indicators([record])}
+                           for record in records)
+    chain = version_chain(_CHANGE_RECORDS, path, previous, version)
+    changed = {}
+    for record in chain or []:
+        for region, indicators in record['changed'].items():
+            changed.setdefault(region, set()).update(indicators)
+        # 已经用过的记录不再需要
+        _CHANGE_RECORDS.remove(record)
+    for name, region in list(_REPORT_VERSIONS):
+        if (region is None) != national:
+            continue
+        if chain is None or changed.get(region, set()) & set(REPORTS[name]['columns']):
+            del _REPORT_VERSIONS[(name, region)]
+
+
+def report_version(name, region=None):
+    """
+    报告使用的数据版本，数据更新后没有变化的报告继续使用原来的版本（和缓存）
+    """
+    version = dataset_version(region)
+    with _LOAD_LOCK:
+        return _REPORT_VERSIONS.setdefault((name, region), version)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def rendered_report(name, region, version, js_host=None, assets_dir=None):
+    """
+    渲染报告页面，结果按 (报告, 地区, 数据版本) 缓存，数据版本变化后旧的页面不再使用，逐渐被淘汰
+    :param assets_dir: 本地 js 目录，页面需要的 js 文件不存在时先下载到这个目录
+    :return: {'body': html, 'gzip': 压缩后的 html, 'etag': ETag}
+    """
+    df = report_dataset(region)
+    if not report_available(name, df):
+        raise KeyError('%s 的数据不足，无法生成报告 %s' % (region or '全国', name))
+    report = REPORTS[name]
+    with span('report.prepare', report=name, region=region):
+        data = report['prepare'](df, region)
+    with span('report.chart', report=name, region=region):
+        page = report['chart'](data)
+        # 图表 id 固定，数据没有变化时重新渲染的页面和 ETag 都不变
+        set_chart_ids(page, report_key(name, region))
+    if assets_dir:
+        ensure_assets(assets_dir, *page_dependencies(page))
+    buffer = io.StringIO()
+    with span('report.render', report=name, region=region):
+        write_page(page, buffer, js_host=js_host)
+    body = buffer.getvalue().encode('utf-8')
+    return {
+        'body': body,
+        # mtime=0 使相同内容压缩后的结果相同
+        'gzip': gzip.compress(body, mtime=0),
+        'etag': '"%s"' % hashlib.sha1(body).hexdigest(),
+    }
+
+
+def index_page():
+    """
+    首页，列出所有报告
+    """
+    links = ''.join('<li><a href="/report/%s">%s</a></li>' % (quote(name), html.escape(name)) for name in REPORTS)
+    return ('<!DOCTYPE html>\n<html>\n<head><meta charset="UTF-8"><title>人口分析报告</title></head>\n'
+            '<body><ul>%s</ul></body>\n</html>\n' % links).encode('utf-8')
+
+
+class ReportHandler(BaseHTTPRequestHandler):
+    """
+    报告请求处理
+    """
+    # 渲染时 js 文件的地址前缀，None 使用 pyecharts 默认地址
+    js_host = None
+    # 本地 js 目录，通过 ASSETS_PATH 提供，None 时不提供静态文件
+    assets_dir = None
+
+    def do_GET(self):
+        self.handle_request(send_body=True)
+
+    def do_HEAD(self):
+        self.handle_request(send_body=False)
+
+    def handle_request(self, send_body):
+        url = urlsplit(self.path)
+        if url.path == '/':
+            self.send_body(index_page(), send_body=send_body)
+            return
+        if self.assets_dir and url.path.startswith(ASSETS_PATH):
+            self.send_asset(url.path[len(ASSETS_PATH):], send_body=send_body)
+            return
+        parts = url.path.strip('/').split('/')
+        if len(parts) != 2 or parts[0] != 'report' or parts[1] not in REPORTS:
+            self.send_error(HTTPStatus.NOT_FOUND, explain='未知的报告，可选：%s' % ', '.join(REPORTS))
+            return
+        region = parse_qs(url.query).get('region', [None])[0]
+        try:
+            page = rendered_report(parts[1], region, report_version(parts[1], region), self.js_host, self.assets_dir)
+        except KeyError as e:
+            # 没有该地区的数据，或者数据不足
+            self.send_error(HTTPStatus.NOT_FOUND, explain=e.args[0])
+            return
+        except requests.RequestException as e:
+            # 本地 js 目录缺少的文件下载失败
+            self.send_error(HTTPStatus.BAD_GATEWAY, explain=str(e))
+            return
+        except OSError as e:
+            # 数据文件不存在
+            self.send_error(HTTPStatus.NOT_FOUND, explain=str(e))
+            return
+
+        # 内容没变化时只返回 304
+        if page['etag'] in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header('ETag', page['etag'])
+            self.end_headers()
+            return
+        use_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+        self.send_body(page['gzip'] if use_gzip else page['body'], etag=page['etag'],
+                       encoding='gzip' if use_gzip else None, send_body=send_body)
+
+    def send_asset(self, filename, send_body=True):
+        """
+        返回本地 js 目录中的文件，只允许目录下的文件名，不能访问目录以外的文件
+        """
+        path = os.path.join(self.assets_dir, filename)
+        if filename != os.path.basename(filename) or filename.startswith('.') or not os.path.isfile(path):
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        with open(path, 'rb') as f:
+            body = f.read()
+        content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        self.send_body(body, content_type=content_type, send_body=send_body)
+
+    def send_body(self, body, etag=None, encoding=None, send_body=True, content_type='text/html; charset=utf-8'):
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+            # 每次都向服务器确认页面是否有变化
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Vary', 'Accept-Encoding')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+
+def create_server(host=HOST, port=PORT, js_host=None):
+    """
+    创建报告服务，调用 serve_forever() 开始处理请求
+    js_host 为本地目录时，服务通过 ASSETS_PATH 提供目录中的 js 文件，页面引用 ASSETS_PATH
+    """
+    assets_dir = None
+    if js_host and is_local_host(js_host):
+        assets_dir = os.path.abspath(js_host)
+        js_host = ASSETS_PATH
+    handler = type('ReportHandler', (ReportHandler,), {'js_host': js_host, 'assets_dir': assets_dir})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='人口分析报告服务')
+    parser.add_argument('--host', default=HOST, help='监听地址')
+    parser.add_argument('--port', type=int, default=PORT, help='监听端口')
+    parser.add_argument('--js-host', default=None, help='js 文件地址前缀或本地目录，默认使用 pyecharts 的地址')
+    args = parser.parse_args(argv)
+
+    server = create_server(args.host, args.port, args.js_host)
+    print('http://%s:%d/' % server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
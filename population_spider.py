@@ -6,81 +6,446 @@
 
 """
 
+import argparse
+import json
+import os
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from population_changes import CHANGE_LOG_PATH, dataset_table, record_changes, region_table
+from population_data import REGION_STORE_PATH, file_version, load_region_store
+from population_files import atomic_path
+from population_schema import conform_dataset, validate_dataset, validate_region_store
+from population_response_cache import CACHE_MODES, RESPONSE_CACHE_DIR, RESPONSE_TTL, ResponseCache
+from population_trace import enable as enable_trace, span, traced
+
+try:
+    import ijson
+    from ijson.common import ObjectBuilder
+except ImportError:
+    # 没有安装 ijson 时整个响应解析后再处理：pip install ijson
+    ijson = None
 
 # 人口数量excel文件保存路径
 POPULATION_EXCEL_PATH = 'population.xlsx'
 
+# 国家统计局数据查询接口
+QUERY_URL = 'http://data.stats.gov.cn/easyquery.htm'
+# 需要爬取的指标，新增指标只需要在这里加一行：(指标代码, 说明)
+# 列名取自接口返回的 wdnodes，与这里的顺序无关
+INDICATORS = [
+    ('A0301', '总人口'),
+    ('A0302', '增长率'),
+    ('A0303', '人口结构'),
+]
+# 查询的时间范围
+PERIOD = 'LAST70'
+# 分省年度数据库，查询条件中多一个地区（reg）
+REGION_DBCODE = 'fsnd'
+# 需要爬取的地区：(地区代码, 地区名)
+REGIONS = [
+    ('110000', '北京市'), ('120000', '天津市'), ('130000', '河北省'), ('140000', '山西省'), ('150000', '内蒙古自治区'),
+    ('210000', '辽宁省'), ('220000', '吉林省'), ('230000', '黑龙江省'), ('310000', '上海市'), ('320000', '江苏省'),
+    ('330000', '浙江省'), ('340000', '安徽省'), ('350000', '福建省'), ('360000', '江西省'), ('370000', '山东省'),
+    ('410000', '河南省'), ('420000', '湖北省'), ('430000', '湖南省'), ('440000', '广东省'), ('450000', '广西壮族自治区'),
+    ('460000', '海南省'), ('500000', '重庆市'), ('510000', '四川省'), ('520000', '贵州省'), ('530000', '云南省'),
+    ('540000', '西藏自治区'), ('610000', '陕西省'), ('620000', '甘肃省'), ('630000', '青海省'), ('640000', '宁夏回族自治区'),
+    ('650000', '新疆维吾尔自治区'),
+]
+# 分省数据与全国数据指标名称不同的列，统一为全国数据的列名
+REGION_COLUMN_ALIASES = {'年末常住人口(万人)': '年末总人口(万人)'}
+# 因为 2019 年数据还没有列入到年度数据表里，所以根据统计局2019年经济报告中给出的人口数据计算得出
+# 接口返回了同一年份的数据时以接口数据为准
+SUPPLEMENT_ROWS = {
+    2019: {'年末总人口(万人)': 140005, '男性人口(万人)': 71527, '女性人口(万人)': 68478, '城镇人口(万人)': 84843,
+           '乡村人口(万人)': 55162, '人口出生率(‰)': 10.48, '人口死亡率(‰)': 7.14, '人口自然增长率(‰)': 3.34,
+           '0-14岁人口(万人)': 25061, '15-64岁人口(万人)': 97341, '65岁及以上人口(万人)': 17603,
+           '总抚养比(%)': 43.82942439, '少儿抚养比(%)': 25.74557483, '老年抚养比(%)': 18.08384956}}
+# 同时发出的最大请求数
+MAX_WORKERS = 4
+# 超时时间（秒）：(连接超时, 读取超时)
+TIMEOUT = (5, 30)
+# 失败重试次数，重试间隔按 BACKOFF_FACTOR * 2^n 秒指数增长
+RETRIES = 3
+BACKOFF_FACTOR = 0.5
+# 响应中数据节点和表结构所在的位置
+DATANODES_PREFIX = 'returndata.datanodes.item'
+WDNODES_PREFIX = 'returndata.wdnodes.item'
+
 
-def spider_population():
+@traced('spider.population')
+def spider_population(max_workers=MAX_WORKERS, incremental=False, cache=None, change_log=CHANGE_LOG_PATH):
     """
     爬取人口数据
+    :param incremental: 增量模式，只爬取 excel 中还没有的年份，并合并到已有数据中
+    :param cache: 接口响应缓存 ResponseCache，None 时每次都请求接口
+    :param change_log: 和已保存的数据比较，变化的格追加到该文件中，见 population_changes；None 表示不比较
+    :return: 本次爬取到的数据，每行一个年份
+    """
+    period = PERIOD
+    stored_df = None
+    if incremental and os.path.exists(POPULATION_EXCEL_PATH):
+        stored_df = read_stored_frame()
+        # 只查询已保存的最后一年之后的数据，例如 2020-
+        period = '%d-' % (stored_df['年份'].max() + 1)
+    previous_df, previous_version = stored_df, None
+    if change_log and os.path.exists(POPULATION_EXCEL_PATH):
+        previous_version = file_version(POPULATION_EXCEL_PATH)
+        if previous_df is None:
+            previous_df = read_previous(read_stored_frame)
+
+    # 所有指标同时请求，各个返回结果按指标代码对齐，与返回顺序无关
+    codes = [code for code, _ in INDICATORS]
+    with span('spider.fetch_all'):
+        results = fetch_all(codes, period=period, max_workers=max_workers, cache=cache, parse=True)
+    population_df = merge_population_info(results)
+
+    # 补充接口中还没有的年份
+    stored_years = set() if stored_df is None else set(stored_df['年份'])
+    supplement = {year: row for year, row in SUPPLEMENT_ROWS.items()
+                  if year not in stored_years and year not in set(population_df['年份'])}
+    if supplement:
+        supplement_df = pd.DataFrame.from_dict(supplement, orient='index').rename_axis('年份').reset_index()
+        population_df = pd.concat([population_df, supplement_df], ignore_index=True)
+
+    if stored_df is not None:
+        if population_df.empty:
+            # 没有新的年份，不需要重写文件
+            return population_df
+        # 新数据覆盖已保存的同一年份
+        stored_df = stored_df[~stored_df['年份'].isin(population_df['年份'])]
+        saved_df = pd.concat([stored_df, population_df], ignore_index=True)
+    else:
+        saved_df = population_df
+    save_excel(saved_df)
+    if change_log:
+        with span('spider.diff'):
+            record_changes(POPULATION_EXCEL_PATH, None if previous_df is None else dataset_table(previous_df),
+                           dataset_table(saved_df), previous_version, change_log)
+
+    return population_df
+
+
+@traced('spider.regions')
+def spider_regions(max_workers=MAX_WORKERS, period=PERIOD, regions=None, cache=None, change_log=CHANGE_LOG_PATH):
+    """
+    爬取分省人口数据，保存为长表格式的 parquet 文件
+    :param regions: 地区代码列表，默认为 REGIONS 中的所有地区
+    :param cache: 接口响应缓存 ResponseCache，None 时每次都请求接口
+    :param change_log: 和已保存的数据比较，变化的格追加到该文件中，见 population_changes；None 表示不比较
+    :return: 长表，列为 region、year、indicator、value
     """
-    # 请求参数 sj（时间），zb（指标）
-    # 总人口
-    dfwds1 = '[{"wdcode": "sj", "valuecode": "LAST70"}, {"wdcode":"zb","valuecode":"A0301"}]'
-    # 增长率
-    dfwds2 = '[{"wdcode": "sj", "valuecode": "LAST70"}, {"wdcode":"zb","valuecode":"A0302"}]'
-    # 人口结构
-    dfwds3 = '[{"wdcode": "sj", "valuecode": "LAST70"}, {"wdcode":"zb","valuecode":"A0303"}]'
-    url = 'http://data.stats.gov.cn/easyquery.htm?m=QueryData&dbcode=hgnd&rowcode=sj&colcode=zb&wds=[]&dfwds={}'
-    # 将所有数据放这里，年份为key，值为各个指标值组成的list
-    # 因为 2019 年数据还没有列入到年度数据表里，所以根据统计局2019年经济报告中给出的人口数据计算得出
-    # 数据顺序为历年数据
-    population_dict = {
-        '2019': [2019, 140005, 71527, 68478, 84843, 55162, 10.48, 7.14, 3.34, 140005, 25061, 97341, 17603, 43.82942439,
-                 25.74557483, 18.08384956]}
+    region_names = dict(REGIONS)
+    regions = list(region_names) if regions is None else regions
+    codes = [code for code, _ in INDICATORS]
+    # 所有地区的所有指标放在同一个线程池中请求
+    with span('spider.fetch_all', regions=len(regions)):
+        results = fetch_all(codes, period=period, max_workers=max_workers, regions=regions, cache=cache, parse=True)
+    frames = []
+    for i, region in enumerate(regions):
+        wide_df = merge_population_info(results[i * len(codes):(i + 1) * len(codes)])
+        frames.append(region_long_frame(region_names.get(region, region), wide_df))
+    store = pd.concat(frames, ignore_index=True)
+    # 地区、指标重复很多，使用 category 类型只保存一份字符串
+    store['region'] = store['region'].astype('category')
+    store['indicator'] = store['indicator'].astype('category')
+    previous_store, previous_version = None, None
+    if change_log and os.path.exists(REGION_STORE_PATH):
+        previous_version = file_version(REGION_STORE_PATH)
+        previous_store = read_previous(load_region_store, REGION_STORE_PATH)
+    save_region_store(store)
+    if change_log:
+        with span('spider.diff', regions=len(regions)):
+            record_changes(REGION_STORE_PATH, None if previous_store is None else region_table(previous_store),
+                           region_table(store), previous_version, change_log)
+    return store
 
-    response1 = requests.get(url.format(dfwds1))
-    get_population_info(population_dict, response1.json())
 
-    response2 = requests.get(url.format(dfwds2))
-    get_population_info(population_dict, response2.json())
+def region_long_frame(region, wide_df):
+    """
+    一个地区的宽表（每行一个年份）转换为长表（每行一个数值）
+    没有数据的空值不保存，读取时再补回
+    """
+    wide_df = wide_df.rename(columns=REGION_COLUMN_ALIASES)
+    wide_df = wide_df.loc[:, ~wide_df.columns.duplicated()]
+    columns = [column for column in wide_df.columns if column != '年份']
+    matrix = wide_df[columns].values
+    years = np.repeat(wide_df['年份'].values, len(columns))
+    indicators = np.tile(np.arange(len(columns)), len(wide_df))
+    values = matrix.ravel()
+    keep = ~np.isnan(values)
+    return pd.DataFrame({
+        'region': region,
+        'year': years[keep].astype(np.int16),
+        'indicator': np.array(columns, dtype=object)[indicators[keep]],
+        'value': values[keep],
+    })
 
-    response3 = requests.get(url.format(dfwds3))
-    get_population_info(population_dict, response3.json())
 
-    save_excel(population_dict)
+def read_stored_frame():
+    """
+    读取 excel 中已保存的数据
+    """
+    df = pd.read_excel(POPULATION_EXCEL_PATH)
+    # 旧版本 excel 中有重复的列名，读取后会被改名为 xxx.1，去掉这些重复列
+    base_columns = df.columns.str.replace(r'\.\d+$', '', regex=True)
+    # 旧版本 excel 中没有数据的值为 0，转换为空值
+    return conform_dataset(df.loc[:, ~base_columns.duplicated()], POPULATION_EXCEL_PATH)
 
-    return population_dict
+
+def read_previous(read, *args):
+    """
+    读取已保存的数据用于比较，文件格式不对时当作没有数据，全部记为新增
+    """
+    try:
+        return read(*args)
+    except ValueError:
+        return None
+
+
+def create_session(pool_size=MAX_WORKERS, retries=RETRIES, backoff_factor=BACKOFF_FACTOR):
+    """
+    创建带连接池和重试的会话，多个请求复用连接
+    """
+    session = requests.Session()
+    retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=(500, 502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def build_params(code, period=PERIOD, region=None):
+    """
+    生成查询参数，sj（时间），zb（指标）
+    :param region: 地区代码，指定时查询分省数据库中该地区的数据
+    """
+    dfwds = [{"wdcode": "sj", "valuecode": period}, {"wdcode": "zb", "valuecode": code}]
+    wds = [] if region is None else [{"wdcode": "reg", "valuecode": region}]
+    return {
+        'm': 'QueryData',
+        'dbcode': 'hgnd' if region is None else REGION_DBCODE,
+        'rowcode': 'sj',
+        'colcode': 'zb',
+        'wds': json.dumps(wds),
+        'dfwds': json.dumps(dfwds),
+    }
+
+
+def fetch_indicator(session, code, period=PERIOD, url=None, timeout=TIMEOUT, region=None, cache=None, parse=False):
+    """
+    查询单个指标，返回 json 数据
+    :param cache: 接口响应缓存 ResponseCache，None 时直接请求接口
+    :param parse: 边读取响应边解析数据节点，返回 get_population_info 的结果，不在内存中保存整个响应
+    """
+    params = build_params(code, period, region)
+    if cache is not None:
+        with span('spider.request', code=code, region=region, cache=cache.mode):
+            fp = cache.open(session, url or QUERY_URL, params, timeout=timeout)
+        with fp, span('spider.parse', code=code, region=region):
+            return read_population_info(fp) if parse else json.load(fp)
+    # request 只统计到收到响应头，边下载边解析时下载响应体的时间算在 parse 中
+    with span('spider.request', code=code, region=region):
+        response = session.get(url or QUERY_URL, params=params, timeout=timeout, stream=parse)
+    with response, span('spider.parse', code=code, region=region):
+        response.raise_for_status()
+        if not parse:
+            return response.json()
+        # 按 Content-Encoding 解压
+        response.raw.decode_content = True
+        return read_population_info(response.raw)
 
 
-def get_population_info(population_dict, json_obj):
+def fetch_all(codes, period=PERIOD, max_workers=MAX_WORKERS, url=None, timeout=TIMEOUT, session=None, regions=None,
+              cache=None, parse=False):
+    """
+    并发查询多个指标，返回的 json 列表与 codes 顺序一致
+    max_workers 为 1 时按顺序逐个请求
+    :param regions: 地区代码列表，指定时查询每个地区的每个指标，返回顺序为 地区1的所有指标、地区2的所有指标...
+    :param parse: 返回解析后的数据而不是 json，见 fetch_indicator
+    """
+    queries = [(code, None) for code in codes] if regions is None else \
+        [(code, region) for region in regions for code in codes]
+    own_session = session is None
+    if own_session:
+        session = create_session(pool_size=max(max_workers, 1))
+    try:
+        if max_workers <= 1:
+            return [fetch_indicator(session, code, period, url, timeout, region, cache, parse) for code, region in queries]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(
+                lambda query: fetch_indicator(session, query[0], period, url, timeout, query[1], cache, parse), queries))
+    finally:
+        if own_session:
+            session.close()
+
+
+def column_name(node):
+    """
+    指标的列名，格式为 名称(单位)，例如 年末总人口(万人)
+    """
+    return '%s(%s)' % (node['cname'], node['unit']) if node.get('unit') else node['cname']
+
+
+def get_population_info(json_obj):
     """
     提取人口数量信息
+    :return: (数据矩阵, 年份数组, 指标代码列表, 列名列表)，矩阵的行对应年份，列对应指标代码
+    """
+    returndata = json_obj['returndata']
+    items = [(DATANODES_PREFIX, node) for node in returndata['datanodes']]
+    items += [(WDNODES_PREFIX, wdnode) for wdnode in returndata['wdnodes']]
+    return collect_population_info(items)
+
+
+def read_population_info(fp):
+    """
+    从响应流中逐个解析数据节点，结果与 get_population_info 相同
+    同一时间只有一个数据节点转换为 python 对象，内存占用与响应大小无关
+    """
+    if ijson is None:
+        return get_population_info(json.load(fp))
+    return collect_population_info(iter_items(ijson.parse(fp, use_float=True), (DATANODES_PREFIX, WDNODES_PREFIX)))
+
+
+def iter_items(events, prefixes):
     """
-    datanodes = json_obj['returndata']['datanodes']
-    for node in datanodes:
-        # 获取年份
-        year = node['code'][-4:]
-        # 数据数值
-        data = node['data']['data']
-        if year in population_dict.keys():
-            population_dict[year].append(data)
-        else:
-            population_dict[year] = [int(year), data]
-    return population_dict
+    从 ijson 的事件流中逐个取出 prefixes 位置的数组元素
+    :return: (prefix, 元素) 迭代器
+    """
+    builder = None
+    current = None
+    for prefix, event, value in events:
+        if builder is None:
+            if prefix in prefixes and event in ('start_map', 'start_array'):
+                builder = ObjectBuilder()
+                current = prefix
+                builder.event(event, value)
+            continue
+        builder.event(event, value)
+        # 元素本身的结束事件，内部嵌套对象的 prefix 更长
+        if prefix == current and event in ('end_map', 'end_array'):
+            yield current, builder.value
+            builder = None
+
+
+def collect_population_info(items):
+    """
+    把数据节点写入数组，表结构读取完后一次性写入矩阵
+    :param items: (prefix, 节点) 迭代器，prefix 为 DATANODES_PREFIX 或 WDNODES_PREFIX，顺序不限
+    """
+    # 每个数据节点只保存指标序号、年份、数值、是否有数据
+    node_codes = {}
+    code_ids = array('q')
+    node_years = array('q')
+    values = array('d')
+    has_data = array('b')
+    wdnodes = {}
+    for prefix, item in items:
+        if prefix == WDNODES_PREFIX:
+            # 表结构：zb 为指标，sj 为时间
+            wdnodes[item['wdcode']] = item['nodes']
+            continue
+        wds = {wd['wdcode']: wd['valuecode'] for wd in item['wds']}
+        code_ids.append(node_codes.setdefault(wds['zb'], len(node_codes)))
+        node_years.append(int(wds['sj']))
+        values.append(item['data']['data'])
+        has_data.append(bool(item['data'].get('hasdata', True)))
+
+    codes = [node['code'] for node in wdnodes['zb']]
+    names = [column_name(node) for node in wdnodes['zb']]
+    years = np.array(sorted(int(node['code']) for node in wdnodes['sj']), dtype=np.int64)
+    code_index = {code: i for i, code in enumerate(codes)}
 
+    # 数据节点中的指标序号转换为矩阵的列号，一次性写入预先分配好的矩阵
+    id_to_col = np.array([code_index[code] for code in node_codes], dtype=np.int64)
+    col_index = id_to_col[np.frombuffer(code_ids, dtype=np.int64)] if len(code_ids) else np.zeros(0, dtype=np.int64)
+    row_index = np.searchsorted(years, np.frombuffer(node_years, dtype=np.int64))
+    has_data = np.frombuffer(has_data, dtype=np.int8).astype(bool)
+    # 没有数据的节点 data 为 0，保存为空值
+    matrix = np.full((len(years), len(codes)), np.nan)
+    matrix[row_index, col_index] = np.where(has_data, np.frombuffer(values, dtype=np.float64), np.nan)
+    # 去掉一个数据都没有的年份
+    row_has_data = np.zeros(len(years), dtype=bool)
+    row_has_data[row_index[has_data]] = True
+    return matrix[row_has_data], years[row_has_data], codes, names
 
-def save_excel(population_dict):
+
+@traced('spider.merge')
+def merge_population_info(results):
+    """
+    合并多个接口返回的数据，按年份和指标代码对齐
+    同名的列（例如多个指标组里都有 年末总人口）只保留指标代码最小的一列，没有数据的值为空值
     """
-    人口数据生成excel文件
-    :param population_dict: 人口数据
+    frames = []
+    names = {}
+    for matrix, years, codes, column_names in results:
+        frames.append(pd.DataFrame(matrix, index=pd.Index(years, name='年份'), columns=codes))
+        names.update(zip(codes, column_names))
+    df = pd.concat(frames, axis=1).sort_index().sort_index(axis=1)
+    df.columns = [names[code] for code in df.columns]
+    df = df.loc[:, ~df.columns.duplicated()]
+    return df.reset_index()
+
+
+@traced('spider.save_excel')
+def save_excel(population_df):
+    """
+    人口数据生成excel文件，格式不对时抛出 ValueError，不覆盖已有的文件
+    :param population_df: 人口数据，每行一个年份
     :return:
     """
-    # .T 是行列转换
-    df = pd.DataFrame(population_dict).T[::-1]
-    df.columns = ['年份', '年末总人口(万人)', '男性人口(万人)', '女性人口(万人)', '城镇人口(万人)', '乡村人口(万人)', '人口出生率(‰)', '人口死亡率(‰)',
-                  '人口自然增长率(‰)', '年末总人口(万人)', '0-14岁人口(万人)', '15-64岁人口(万人)', '65岁及以上人口(万人)', '总抚养比(%)',
-                  '少儿抚养比(%)', '老年抚养比(%)']
-    writer = pd.ExcelWriter(POPULATION_EXCEL_PATH)
-    # columns参数用于指定生成的excel中列的顺序
-    df.to_excel(excel_writer=writer, index=False, encoding='utf-8', sheet_name='中国70年人口数据')
-    writer.save()
-    writer.close()
+    validate_dataset(population_df, '爬取的数据')
+    # 按年份排序
+    df = population_df.sort_values('年份')
+    # 先写临时文件再替换，读取的一方不会读到写了一半的文件；临时文件按 umask 创建，替换后其它用户仍可读取
+    # 保留 .xlsx 扩展名，pandas 按扩展名选择写入方式
+    with atomic_path(POPULATION_EXCEL_PATH, keep_extension=True) as tmp_path:
+        with pd.ExcelWriter(tmp_path) as writer:
+            df.to_excel(excel_writer=writer, index=False, sheet_name='中国70年人口数据')
+
+
+@traced('spider.save_region_store')
+def save_region_store(store, path=REGION_STORE_PATH):
+    """
+    保存分地区长表，先写临时文件再替换，格式不对时抛出 ValueError，不覆盖已有的文件
+    需要安装 pyarrow：pip install pyarrow
+    """
+    validate_region_store(store, '爬取的分地区数据')
+    df = store.sort_values(['region', 'year', 'indicator'], ignore_index=True)
+    with atomic_path(path) as tmp_path:
+        df.to_parquet(tmp_path, index=False)
 
 
 if __name__ == '__main__':
-    result_dict = spider_population()
-    # print(result_dict)
+    parser = argparse.ArgumentParser(description='爬取国家统计局人口数据')
+    parser.add_argument('--incremental', action='store_true', help='只爬取 excel 中还没有的年份')
+    parser.add_argument('--jobs', type=int, default=MAX_WORKERS, help='同时发出的最大请求数')
+    parser.add_argument('--regions', action='store_true', help='同时爬取分省数据，保存到 %s' % REGION_STORE_PATH)
+    parser.add_argument('--cache', choices=CACHE_MODES + ('off',), default='online',
+                        help='接口响应缓存：online 缓存过期后重新确认，refresh 全部重新请求，offline 只使用缓存不访问网络，off 不使用缓存')
+    parser.add_argument('--cache-dir', default=RESPONSE_CACHE_DIR, help='缓存目录，也可以指定录制好的测试数据目录')
+    parser.add_argument('--cache-ttl', type=float, default=RESPONSE_TTL, help='缓存有效期（秒）')
+    parser.add_argument('--trace', default=None, metavar='PATH',
+                        help='记录各阶段耗时和内存变化，.prom 结尾为 Prometheus 文本格式，否则为 JSON lines')
+    parser.add_argument('--profile-dir', default=None, help='cProfile/tracemalloc 结果保存到该目录，需要同时指定 --trace')
+    parser.add_argument('--change-log', default=CHANGE_LOG_PATH,
+                        help='和已保存的数据比较，变化的格追加到该文件中，空字符串表示不比较')
+    args = parser.parse_args()
+    if args.trace:
+        enable_trace(args.trace, args.profile_dir)
+    elif args.profile_dir:
+        parser.error('--profile-dir 需要同时指定 --trace')
+    response_cache = None if args.cache == 'off' else ResponseCache(args.cache_dir, args.cache_ttl, args.cache)
+    change_log = args.change_log or None
+    result_df = spider_population(max_workers=args.jobs, incremental=args.incremental, cache=response_cache,
+                                  change_log=change_log)
+    if args.regions:
+        spider_regions(max_workers=args.jobs, cache=response_cache, change_log=change_log)
+    # print(result_df)
@@ -0,0 +1,100 @@
+"""
+图表公共样式
+背景渐变、坐标轴、标题等样式在所有图表中都一样，每个进程只创建一次，所有图表共用同一个对象，
+序列化后的 json 也只生成一次，dump_options 生成图表配置时直接拼接缓存的 json
+
+获取详细教程、获取代码帮助、提出意见建议
+关注微信公众号「裸睡的猪」与猪哥联系
+
+@Author  :   猪哥
+
+"""
+from functools import lru_cache
+
+import pyecharts.options as opts
+import simplejson as json
+from pyecharts.charts.base import default
+from pyecharts.commons import utils
+from pyecharts.commons.utils import JsCode
+
+# 自定义pyecharts图形背景颜色js
+background_color_js = (
+    "new echarts.graphic.LinearGradient(0, 0, 0, 1, "
+    "[{offset: 0, color: '#c86589'}, {offset: 1, color: '#06a7ff'}], false)"
+)
+# 自定义pyecharts图像区域颜色js
+area_color_js = (
+    "new echarts.graphic.LinearGradient(0, 0, 0, 1, "
+    "[{offset: 0, color: '#eb64fb'}, {offset: 1, color: '#3fbbff0d'}], false)"
+)
+
+# 样式名 -> 创建样式的函数
+_BUILDERS = {
+    # 深色背景图表：背景渐变、区域渐变
+    'dark_background': lambda: JsCode(background_color_js),
+    'dark_area': lambda: JsCode(area_color_js),
+    'dark_init': lambda: opts.InitOpts(bg_color=fragment('dark_background')),
+    # 深色背景图表：标题、数值标签
+    'dark_title_text': lambda: opts.TextStyleOpts(color="#fff", font_size=16),
+    'dark_value_label': lambda: opts.LabelOpts(color='white', font_size=16),
+    # 深色背景图表：坐标轴
+    'dark_axis_label_x': lambda: opts.LabelOpts(margin=30, color="#ffffff63"),
+    'dark_axis_label_y': lambda: opts.LabelOpts(margin=20, color="#ffffff63"),
+    'dark_axis_line': lambda: opts.AxisLineOpts(linestyle_opts=opts.LineStyleOpts(width=0, color="#ffffff1f")),
+    'dark_axis_tick_x': lambda: opts.AxisTickOpts(
+        is_show=True, length=25, linestyle_opts=opts.LineStyleOpts(color="#ffffff1f")
+    ),
+    'dark_axis_tick_y': lambda: opts.AxisTickOpts(
+        is_show=True, length=15, linestyle_opts=opts.LineStyleOpts(color="#ffffff1f")
+    ),
+    'dark_split_line': lambda: opts.SplitLineOpts(is_show=False, linestyle_opts=opts.LineStyleOpts(color="#ffffff1f")),
+    # 通用
+    'hidden_axis_line': lambda: opts.AxisLineOpts(is_show=False),
+    'hidden_label': lambda: opts.LabelOpts(is_show=False),
+    'hidden_legend': lambda: opts.LegendOpts(is_show=False),
+    'category_axis': lambda: opts.AxisOpts(type_="category"),
+}
+
+# 已创建的样式，id(对象) -> (对象, 样式名)，dump_options 用来识别共用的样式
+# 同时保存对象本身：对象一直存活，id 不会被其他对象复用，查找时再比较是否为同一个对象
+_FRAGMENTS = {}
+# 生成 json 时样式的占位符
+_PLACEHOLDER = '--population-theme-%s--'
+
+
+@lru_cache(maxsize=None)
+def fragment(name):
+    """
+    获取公共样式，同一个样式只创建一次
+    """
+    value = _BUILDERS[name]()
+    _FRAGMENTS[id(value)] = (value, name)
+    return value
+
+
+@lru_cache(maxsize=None)
+def fragment_json(name):
+    """
+    公共样式序列化后的 json，只生成一次
+    """
+    return json.dumps(fragment(name), default=default, ignore_nan=True)
+
+
+def _default(o):
+    # 公共样式先用占位符代替，生成 json 后再替换为缓存的 json
+    value, name = _FRAGMENTS.get(id(o), (None, None))
+    if value is o:
+        return _PLACEHOLDER % name
+    return default(o)
+
+
+def dump_options(chart):
+    """
+    生成图表配置 json，内容与 chart.dump_options() 相同，公共样式直接拼接缓存的 json
+    """
+    content = json.dumps(chart.get_options(), indent=4, default=_default, ignore_nan=True)
+    for name in set(name for _, name in list(_FRAGMENTS.values())):
+        placeholder = '"%s"' % (_PLACEHOLDER % name)
+        if placeholder in content:
+            content = content.replace(placeholder, fragment_json(name))
+    return utils.replace_placeholder(content)
@@ -0,0 +1,254 @@
+"""
+运行耗时统计
+用 span 上下文管理器或者 traced 装饰器标记各个阶段，记录耗时和常驻内存变化：
+- 文件名以 .prom 结尾时按阶段汇总为 Prometheus 文本格式（可以交给 node_exporter 的 textfile 收集）
+- 其它文件名每个阶段写一行 json（JSON lines）
+- 指定 profile 目录时，最外层的阶段同时用 cProfile 和 tracemalloc 记录，结束后保存到该目录
+没有启用时 span 直接返回一个空的上下文管理器，几乎没有开销
+
+通过环境变量启用，子进程也会继承：
+POPULATION_TRACE=trace.jsonl POPULATION_TRACE_PROFILE=profiles python -m population_analysis render --all
+
+获取详细教程、获取代码帮助、提出意见建议
+关注微信公众号「裸睡的猪」与猪哥联系
+
+@Author  :   猪哥
+
+"""
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+from population_files import write_atomic
+
+# 启用统计的环境变量：输出文件路径
+TRACE_ENV = 'POPULATION_TRACE'
+# 启用 cProfile/tracemalloc 的环境变量：输出目录
+PROFILE_ENV = 'POPULATION_TRACE_PROFILE'
+# tracemalloc 结果保存的行数
+TRACEMALLOC_TOP = 30
+# 启用统计的进程号，子进程的 Prometheus 文件名中带有自己的进程号
+PID_ENV = 'POPULATION_TRACE_PID'
+# Prometheus 指标名前缀
+METRIC_PREFIX = 'population_span'
+
+# 当前配置，None 表示没有启用
+_STATE = None
+_LOCK = threading.Lock()
+# 每个线程当前所在的阶段
+_LOCAL = threading.local()
+_NOOP = contextlib.nullcontext()
+
+
+def current_rss_mb():
+    """
+    当前常驻内存（MB），只支持 linux，其它系统返回 None
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def enable(path, profile_dir=None):
+    """
+    启用统计
+    :param path: 输出文件，.prom 结尾为 Prometheus 文本格式，否则为 JSON lines
+    :param profile_dir: cProfile/tracemalloc 结果保存目录，None 表示不记录
+    """
+    global _STATE
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+    # 子进程通过环境变量启用，写入同一个文件
+    os.environ[TRACE_ENV] = path
+    os.environ.setdefault(PID_ENV, str(os.getpid()))
+    if profile_dir:
+        os.environ[PROFILE_ENV] = profile_dir
+    else:
+        os.environ.pop(PROFILE_ENV, None)
+    _STATE = {
+        'path': path,
+        'prometheus': path.endswith('.prom'),
+        'profile_dir': profile_dir,
+        'metrics': {},
+        'count': 0,
+    }
+
+
+def disable():
+    """
+    停止统计
+    """
+    global _STATE
+    _STATE = None
+    for name in (TRACE_ENV, PROFILE_ENV, PID_ENV):
+        os.environ.pop(name, None)
+
+
+def enabled():
+    return _STATE is not None
+
+
+def span(name, **labels):
+    """
+    标记一个阶段，with span('spider.fetch'): ...
+    :param labels: 附加的标签，值为 None 的标签不记录
+    """
+    if _STATE is None:
+        return _NOOP
+    return _span(name, labels)
+
+
+def traced(name=None):
+    """
+    装饰器，函数的每次调用作为一个阶段，默认阶段名为 模块名.函数名
+    """
+    def decorator(func):
+        span_name = name or '%s.%s' % (func.__module__, func.__name__)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _STATE is None:
+                return func(*args, **kwargs)
+            with _span(span_name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextlib.contextmanager
+def _span(name, labels):
+    state = _STATE
+    stack = getattr(_LOCAL, 'stack', None)
+    if stack is None:
+        stack = _LOCAL.stack = []
+    parent = stack[-1] if stack else None
+    # 只在最外层的阶段记录 cProfile/tracemalloc，它们不能嵌套
+    profiler = None
+    if state['profile_dir'] and not stack and threading.current_thread() is threading.main_thread():
+        profiler = cProfile.Profile()
+        tracemalloc.start()
+        profiler.enable()
+    stack.append(name)
+    rss_before = current_rss_mb()
+    start_time = time.time()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        rss_after = current_rss_mb()
+        stack.pop()
+        record = {
+            'span': name,
+            'labels': {key: value for key, value in labels.items() if value is not None},
+            'parent': parent,
+            'start': start_time,
+            'duration_s': duration,
+            'rss_delta_mb': None if rss_before is None else rss_after - rss_before,
+            'pid': os.getpid(),
+        }
+        if error:
+            record['error'] = error
+        if profiler is not None:
+            profiler.disable()
+            record['profile'] = _dump_profile(state, name, profiler)
+        _emit(state, record)
+
+
+def _dump_profile(state, name, profiler):
+    """
+    保存 cProfile 和 tracemalloc 的结果，返回文件名（不含扩展名）
+    """
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    with _LOCK:
+        state['count'] += 1
+        count = state['count']
+    base = os.path.join(state['profile_dir'], '%s-%d-%d' % (name, os.getpid(), count))
+    profiler.dump_stats(base + '.prof')
+    with open(base + '.tracemalloc.txt', 'w', encoding='utf-8') as f:
+        for stat in snapshot.statistics('lineno')[:TRACEMALLOC_TOP]:
+            f.write('%s\n' % stat)
+    return base
+
+
+def _label_text(labels):
+    return ','.join('%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                    for key, value in sorted(labels.items()))
+
+
+def _emit(state, record):
+    if not state['prometheus']:
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with _LOCK:
+            # 追加模式下一次写入一整行，多个进程同时写也不会交错
+            with open(state['path'], 'a', encoding='utf-8') as f:
+                f.write(line)
+        return
+
+    labels = dict(record['labels'], span=record['span'])
+    key = _label_text(labels)
+    with _LOCK:
+        metric = state['metrics'].setdefault(key, {'count': 0, 'sum': 0.0, 'max': 0.0, 'rss': 0.0})
+        metric['count'] += 1
+        metric['sum'] += record['duration_s']
+        metric['max'] = max(metric['max'], record['duration_s'])
+        metric['rss'] += record['rss_delta_mb'] or 0.0
+        if record['parent'] is None:
+            # 最外层阶段结束后写入文件，进程被强制结束时也能保留已完成的统计
+            _write_prometheus(state)
+
+
+def _write_prometheus(state):
+    """
+    写入 Prometheus 文本格式，每个进程一个文件，子进程的文件名中带有进程号
+    """
+    path = state['path']
+    if str(os.getpid()) != os.environ.get(PID_ENV, str(os.getpid())):
+        path = '%s.%d.prom' % (path[:-len('.prom')], os.getpid())
+    lines = [
+        '# HELP %s_seconds 阶段耗时（秒）' % METRIC_PREFIX,
+        '# TYPE %s_seconds summary' % METRIC_PREFIX,
+    ]
+    for key, metric in sorted(state['metrics'].items()):
+        lines.append('%s_seconds_sum{%s} %.6f' % (METRIC_PREFIX, key, metric['sum']))
+        lines.append('%s_seconds_count{%s} %d' % (METRIC_PREFIX, key, metric['count']))
+    lines += ['# HELP %s_max_seconds 阶段最长耗时（秒）' % METRIC_PREFIX, '# TYPE %s_max_seconds gauge' % METRIC_PREFIX]
+    lines += ['%s_max_seconds{%s} %.6f' % (METRIC_PREFIX, key, metric['max'])
+              for key, metric in sorted(state['metrics'].items())]
+    lines += ['# HELP %s_rss_delta_bytes 阶段常驻内存变化累计（字节）' % METRIC_PREFIX,
+              '# TYPE %s_rss_delta_bytes gauge' % METRIC_PREFIX]
+    lines += ['%s_rss_delta_bytes{%s} %d' % (METRIC_PREFIX, key, metric['rss'] * 1024 * 1024)
+              for key, metric in sorted(state['metrics'].items())]
+    write_atomic(path, '\n'.join(lines) + '\n')
+
+
+def _reset_after_fork():
+    # fork 出的子进程不重复统计父进程已经完成的阶段
+    if _STATE is not None:
+        _STATE['metrics'] = {}
+        _STATE['count'] = 0
+    _LOCAL.stack = []
+
+
+def _configure_from_env():
+    path = os.environ.get(TRACE_ENV)
+    if path:
+        enable(path, os.environ.get(PROFILE_ENV) or None)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+_configure_from_env()
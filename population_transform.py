@@ -0,0 +1,133 @@
+"""
+数据转换
+单位换算、比例计算、同比、滑动平均等都用 numpy 整列计算，结果四舍五入后仍然是数值，直接传给图表
+
+获取详细教程、获取代码帮助、提出意见建议
+关注微信公众号「裸睡的猪」与猪哥联系
+
+@Author  :   猪哥
+
+"""
+import numpy as np
+
+# 默认保留的小数位数
+DECIMALS = 2
+# 放大后的小数部分与 0.5 相差小于这个值时按十进制重新舍入
+TIE_TOLERANCE = 1e-6
+
+
+def as_array(values):
+    """
+    转换为 float64 数组，Series、list、数值都可以
+    """
+    return np.asarray(values, dtype=np.float64)
+
+
+def round_values(values, decimals=DECIMALS):
+    """
+    四舍五入，结果与 '%.2f' 格式化相同
+    np.round 先乘 10 ** decimals 再取整，乘法的误差会使 13.345 这样正好在中间的值舍入到另一边，
+    这些值单独用 round 按十进制精确舍入
+    """
+    values = as_array(values)
+    scaled = values * 10 ** decimals
+    # 单个数值时 np.round 返回的不是数组，转换为 0 维数组后才能按位置修改
+    result = np.array(np.round(scaled) / 10 ** decimals)
+    with np.errstate(invalid='ignore'):
+        ties = np.abs(scaled - np.floor(scaled) - 0.5) < TIE_TOLERANCE
+    for position in np.flatnonzero(ties):
+        result.flat[position] = round(float(values.flat[position]), decimals)
+    return result[()]
+
+
+def to_yi(values, decimals=DECIMALS):
+    """
+    万人 转换为 亿人
+    """
+    return round_values(as_array(values) / 10000, decimals)
+
+
+def percent(part, total, decimals=DECIMALS):
+    """
+    part 占 total 的百分比，例如 男性人口/总人口 x 100
+    total 为空值或者 0 的年份结果为 nan 或 inf，生成图表时为空值
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return round_values(as_array(part) / as_array(total) * 100, decimals)
+
+
+def difference(minuend, subtrahend):
+    """
+    两列相减
+    """
+    return as_array(minuend) - as_array(subtrahend)
+
+
+def column_sum(values):
+    """
+    多列相加，values 为列的列表；只有一列时直接返回该列
+    """
+    if isinstance(values, (list, tuple)):
+        return np.sum([as_array(value) for value in values], axis=0)
+    return as_array(values)
+
+
+def lag_positions(years, window):
+    """
+    每一年往前 window 年所在的行号，years 为按年份排序的年份列
+    :return: (行号数组, 是否有该年份的数据)
+    """
+    years = np.asarray(years)
+    positions = np.searchsorted(years, years - window)
+    found = positions < len(years)
+    found[found] = years[positions[found]] == years[found] - window
+    return np.where(found, positions, 0), found
+
+
+def change(values, years, window=1):
+    """
+    与 window 年前相比的变化量，没有 window 年前数据的年份为 nan
+    """
+    values = as_array(values)
+    positions, found = lag_positions(years, window)
+    return np.where(found, values - values[positions], np.nan)
+
+
+def growth_rate(values, years, window=1, decimals=DECIMALS):
+    """
+    与 window 年前相比的增长率（%），例如 window=1 为同比增长率
+    """
+    values = as_array(values)
+    positions, found = lag_positions(years, window)
+    base = values[positions]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = (values / base - 1) * 100
+    return round_values(np.where(found & (base > 0), rate, np.nan), decimals)
+
+
+def cagr(values, years, window, decimals=DECIMALS):
+    """
+    window 年的复合年均增长率（%）：(当年 / window 年前) ^ (1 / window) - 1
+    """
+    values = as_array(values)
+    positions, found = lag_positions(years, window)
+    base = values[positions]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = (np.power(values / base, 1.0 / window) - 1) * 100
+    return round_values(np.where(found & (base > 0) & (values > 0), rate, np.nan), decimals)
+
+
+def rolling_mean(values, window, decimals=DECIMALS):
+    """
+    最近 window 行的平均值，用累加和一次算出，前 window-1 行以及 window 行内有空值的为 nan
+    """
+    values = as_array(values)
+    result = np.full(len(values), np.nan)
+    if window <= len(values):
+        # 空值按 0 累加，另外累加空值的个数，避免一个空值使之后的累加和都为 nan
+        missing = np.isnan(values)
+        cumsum = np.concatenate(([0.0], np.cumsum(np.where(missing, 0.0, values))))
+        gaps = np.concatenate(([0], np.cumsum(missing)))
+        sums = (cumsum[window:] - cumsum[:-window]) / window
+        result[window - 1:] = np.where(gaps[window:] > gaps[:-window], np.nan, sums)
+    return round_values(result, decimals)
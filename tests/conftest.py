@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# 测试直接导入仓库根目录下的模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import easyquery_stub  # noqa: E402
+
+
+@pytest.fixture
+def easyquery():
+    """
+    本地的 easyquery 接口替身，返回 (server, 接口地址)
+    """
+    server, url = easyquery_stub.start_server()
+    yield server, url
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,126 @@
+"""
+国家统计局 easyquery 接口的本地替身，测试时代替 data.stats.gov.cn
+用 http.server 返回固定的 QueryData 响应，格式与真实接口相同（datanodes + wdnodes），数据取自 2016-2018 年
+每个请求先等待 DELAY 秒，模拟网络延迟；支持 ETag/If-None-Match，可以测试接口响应缓存
+
+获取详细教程、获取代码帮助、提出意见建议
+关注微信公众号「裸睡的猪」与猪哥联系
+
+@Author  :   猪哥
+
+"""
+import hashlib
+import json
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# 每个指标分组的指标：(指标代码, 名称, 单位)
+INDICATOR_NODES = {
+    'A0301': [('A030101', '年末总人口', '万人'), ('A030102', '男性人口', '万人'), ('A030103', '女性人口', '万人'),
+              ('A030104', '城镇人口', '万人'), ('A030105', '乡村人口', '万人')],
+    'A0302': [('A030201', '人口出生率', '‰'), ('A030202', '人口死亡率', '‰'), ('A030203', '人口自然增长率', '‰')],
+    'A0303': [('A030301', '年末总人口', '万人'), ('A030302', '0-14岁人口', '万人'), ('A030303', '15-64岁人口', '万人'),
+              ('A030304', '65岁及以上人口', '万人'), ('A030305', '总抚养比', '%'), ('A030306', '少儿抚养比', '%'),
+              ('A030307', '老年抚养比', '%')],
+}
+# 接口返回的年份
+YEARS = [2016, 2017, 2018]
+# 每个指标各年份的数据，与 YEARS 对应
+VALUES = {
+    'A030101': [138271, 139008, 139538], 'A030102': [70815, 71137, 71351], 'A030103': [67456, 67871, 68187],
+    'A030104': [79298.42, 81347.48, 83136.74], 'A030105': [58972.58, 57660.52, 56401.26],
+    'A030201': [12.95, 12.43, 10.94], 'A030202': [7.09, 7.11, 7.13], 'A030203': [5.86, 5.32, 3.81],
+    'A030301': [138271, 139008, 139538], 'A030302': [23008, 23348, 23523], 'A030303': [100260, 99829, 99357],
+    'A030304': [15003, 15831, 16658], 'A030305': [37.9, 39.25, 40.44], 'A030306': [22.9, 23.39, 23.68],
+    'A030307': [15.0, 15.86, 16.77],
+}
+# 地区数据按地区代码前两位缩小，使每个地区的数据不同
+REGION_SCALE_DIVISOR = 100
+# 每个请求的延迟（秒）
+DELAY = 0.1
+
+
+def query_years(period):
+    """
+    查询的时间范围对应的年份，支持 LAST10 和 2017- 两种格式，从新到旧排列（与真实接口相同）
+    """
+    if period.startswith('LAST'):
+        years = YEARS[-int(period[len('LAST'):]):]
+    else:
+        years = [year for year in YEARS if year >= int(period.rstrip('-'))]
+    return years[::-1]
+
+
+def query_data(code, period, region=None):
+    """
+    一个指标分组的 QueryData 响应
+    :param region: 地区代码，指定时返回缩小后的地区数据
+    """
+    years = query_years(period)
+    scale = 1 if region is None else int(region[:2]) / REGION_SCALE_DIVISOR
+    datanodes = []
+    for indicator, name, unit in INDICATOR_NODES[code]:
+        # 比例类的指标不随地区缩小
+        factor = 1 if unit in ('‰', '%') else scale
+        for year in years:
+            value = round(VALUES[indicator][YEARS.index(year)] * factor, 2)
+            datanodes.append({
+                'code': 'zb.%s_sj.%d' % (indicator, year),
+                'data': {'data': value, 'dotcount': 2, 'hasdata': True, 'strdata': str(value)},
+                'wds': [{'valuecode': indicator, 'wdcode': 'zb'}, {'valuecode': str(year), 'wdcode': 'sj'}],
+            })
+    wdnodes = [
+        {'wdcode': 'zb', 'wdname': '指标',
+         'nodes': [{'code': indicator, 'cname': name, 'name': name, 'unit': unit, 'dotcount': 2}
+                   for indicator, name, unit in INDICATOR_NODES[code]]},
+        {'wdcode': 'sj', 'wdname': '时间',
+         'nodes': [{'code': str(year), 'cname': '%d年' % year, 'name': '%d年' % year} for year in years]},
+    ]
+    return {'returncode': 200,
+            'returndata': {'datanodes': datanodes, 'freshsort': 0, 'hasdatacount': len(datanodes), 'wdnodes': wdnodes}}
+
+
+class EasyQueryHandler(BaseHTTPRequestHandler):
+    """
+    只处理 QueryData 查询，收到的查询条件记录在 server.requests 中，返回 304 的次数记录在 server.not_modified 中
+    """
+
+    def do_GET(self):
+        params = {key: values[0] for key, values in parse_qs(urlsplit(self.path).query).items()}
+        dfwds = {item['wdcode']: item['valuecode'] for item in json.loads(params['dfwds'])}
+        wds = {item['wdcode']: item['valuecode'] for item in json.loads(params.get('wds', '[]'))}
+        self.server.requests.append(dict(dfwds, **wds))
+        time.sleep(DELAY)
+        body = json.dumps(query_data(dfwds['zb'], dfwds['sj'], wds.get('reg')), ensure_ascii=False).encode('utf-8')
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        if self.headers.get('If-None-Match') == etag:
+            self.server.not_modified += 1
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', 'application/json;charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 测试时不输出访问日志
+        pass
+
+
+def start_server(host='127.0.0.1', port=0):
+    """
+    在后台线程中启动接口替身，port 为 0 时使用随机端口
+    :return: (server, 接口地址)，用完后调用 server.shutdown() 和 server.server_close()
+    """
+    server = ThreadingHTTPServer((host, port), EasyQueryHandler)
+    server.requests = []
+    server.not_modified = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://%s:%d/easyquery.htm' % server.server_address[:2]
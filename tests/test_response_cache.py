@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+from population_response_cache import ResponseCache
+from population_spider import INDICATORS, fetch_all, merge_population_info
+
+CODES = [code for code, _ in INDICATORS]
+# 离线回放时使用的接口地址，没有服务监听，请求了就会失败
+UNREACHABLE_URL = 'http://127.0.0.1:9/easyquery.htm'
+
+
+def test_offline_replay_of_recorded_responses(easyquery, tmp_path):
+    """
+    录制的响应在离线模式下回放，结果与在线请求相同并且不访问接口
+    """
+    server, url = easyquery
+    online = fetch_all(CODES, max_workers=len(CODES), url=url)
+    recorded = fetch_all(CODES, max_workers=len(CODES), url=url, cache=ResponseCache(str(tmp_path), mode='refresh'))
+    requests = len(server.requests)
+
+    offline = ResponseCache(str(tmp_path), mode='offline')
+    assert fetch_all(CODES, max_workers=len(CODES), url=UNREACHABLE_URL, cache=offline) == online == recorded
+    pd.testing.assert_frame_equal(
+        merge_population_info(fetch_all(CODES, max_workers=1, url=UNREACHABLE_URL, cache=offline, parse=True)),
+        merge_population_info(fetch_all(CODES, max_workers=1, url=url, parse=True)))
+    assert len(server.requests) == requests + len(CODES)
+
+
+def test_offline_replay_without_recording(tmp_path):
+    """
+    离线模式下没有录制的查询直接报错
+    """
+    with pytest.raises(KeyError):
+        fetch_all(CODES, max_workers=1, url=UNREACHABLE_URL, cache=ResponseCache(str(tmp_path), mode='offline'))
+
+
+def test_expired_cache_revalidates_with_etag(easyquery, tmp_path):
+    """
+    缓存过期后带上 ETag 重新确认，内容没有变化时接口返回 304，继续使用缓存
+    """
+    server, url = easyquery
+    first = fetch_all(CODES, max_workers=1, url=url, cache=ResponseCache(str(tmp_path)))
+    second = fetch_all(CODES, max_workers=1, url=url, cache=ResponseCache(str(tmp_path), ttl=0))
+
+    assert second == first
+    assert len(server.requests) == 2 * len(CODES)
+    assert server.not_modified == len(CODES)
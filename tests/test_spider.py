@@ -0,0 +1,41 @@
+import time
+
+import easyquery_stub
+from population_spider import INDICATORS, fetch_all, merge_population_info
+
+CODES = [code for code, _ in INDICATORS]
+REGIONS = ['110000', '120000']
+
+
+def timed_fetch_all(url, max_workers, **kwargs):
+    start = time.perf_counter()
+    results = fetch_all(CODES, max_workers=max_workers, url=url, **kwargs)
+    return results, time.perf_counter() - start
+
+
+def test_fetch_all_parallel_matches_serial(easyquery):
+    """
+    并发请求与逐个请求的结果相同，顺序与指标代码一致，并且耗时明显更短
+    """
+    server, url = easyquery
+    serial, serial_time = timed_fetch_all(url, max_workers=1, regions=REGIONS)
+    parallel, parallel_time = timed_fetch_all(url, max_workers=len(CODES) * len(REGIONS), regions=REGIONS)
+
+    assert parallel == serial
+    assert [result['returndata']['wdnodes'][0]['nodes'][0]['code'][:5] for result in serial] == CODES * len(REGIONS)
+    assert len(server.requests) == 2 * len(CODES) * len(REGIONS)
+    # 逐个请求至少要等待每个请求的延迟，并发请求的延迟重叠
+    assert serial_time >= len(CODES) * len(REGIONS) * easyquery_stub.DELAY
+    assert parallel_time < serial_time / 2
+
+
+def test_fetch_all_parsed_rows(easyquery):
+    """
+    边下载边解析的结果合并后为每年一行
+    """
+    _, url = easyquery
+    df = merge_population_info(fetch_all(CODES, max_workers=len(CODES), url=url, parse=True))
+
+    assert list(df['年份']) == easyquery_stub.YEARS
+    assert list(df['年末总人口(万人)']) == easyquery_stub.VALUES['A030101']
+    assert list(df['人口出生率(‰)']) == easyquery_stub.VALUES['A030201']